@@ -0,0 +1,385 @@
+# bench.py
+
+"""
+Benchmarks for db.py and the main ui.py paths on synthetic ledgers.
+
+    python bench.py                                 # 10k, 100k and 1M rows
+    python bench.py --sizes 10000 100000 --repeat 5
+    python bench.py --output results.json           # machine-readable results
+    python bench.py --baseline results.json         # compare against a stored run
+    python bench.py --no-ui                         # skip the Qt benchmarks
+
+Every size runs against a fresh database in a temporary directory, filled by
+generate_ledger(), which yields the same expenses for the same size and seed.
+The read-through cache is cleared before every sample, so the timings are
+those of the database, not of the cache. The UI benchmarks run under
+QT_QPA_PLATFORM=offscreen unless another platform is set.
+
+With --baseline, benchmarks slower than the baseline by more than
+--threshold (and more than MIN_DIFFERENCE_MS) are marked as regressions and
+the exit code is 1.
+"""
+
+
+
+# =========================
+# imports
+# =========================
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+import db
+
+
+
+# =========================
+# configuration
+# =========================
+
+# ledger sizes run by default
+SIZES = [10_000, 100_000, 1_000_000]
+
+# samples per benchmark, the median is compared against the baseline
+REPEAT = 3
+
+# expenses taken per sample by edit_expense x100, edit_expenses(1000),
+# delete_expense x100 and delete_expenses(1000), every sample takes new ones
+WRITE_COUNTS = (100, 1000, 100, 1000)
+
+# a benchmark is a regression if it is this much slower than the baseline,
+# and by more than MIN_DIFFERENCE_MS, so sub-millisecond noise is not reported
+THRESHOLD = 1.2
+MIN_DIFFERENCE_MS = 1.0
+
+# the synthetic ledgers end on this day and have this many expenses per day on average
+END_DATE = datetime.date(2024, 12, 31)
+EXPENSES_PER_DAY = 8
+
+# category -> (weight, names, typical amount in euros, fixed)
+CATEGORIES = {
+    "groceries":     (30, ["Supermarket", "Bakery", "Farmers Market", "Organic Store"], 35, False),
+    "restaurants":   (12, ["Pizzeria", "Sushi Bar", "Cafe", "Burger Place"], 25, False),
+    "transport":     (12, ["Train Ticket", "Bus Pass", "Fuel", "Taxi"], 20, False),
+    "shopping":      (10, ["Clothing Store", "Electronics", "Bookshop", "Online Order"], 60, False),
+    "entertainment": (8, ["Cinema", "Concert", "Streaming", "Museum"], 18, False),
+    "health":        (5, ["Pharmacy", "Doctor", "Dentist"], 40, False),
+    "travel":        (3, ["Hotel", "Flight", "Car Rental"], 250, False),
+    "education":     (2, ["Online Course", "Textbooks"], 80, False),
+    "rent":          (4, ["Rent"], 950, True),
+    "utilities":     (6, ["Electricity", "Water", "Internet", "Phone"], 55, True),
+    "insurance":     (4, ["Health Insurance", "Car Insurance", "Liability Insurance"], 70, True),
+    "gifts":         (2, ["Birthday Present", "Wedding Gift", "Donation"], 45, False),
+    "miscellaneous": (2, ["Post Office", "Hardware Store", "Laundry"], 15, False),
+}
+
+COMMENTS = ["", "", "", "", "paid by card", "split with friends", "monthly", "discount applied", "refund pending"]
+
+
+
+# =========================
+# synthetic ledger
+# =========================
+def generate_ledger(rows, seed=0):
+    """
+    yield rows expense dicts in date order, the same ones for the same rows and seed
+    the ledger covers rows / EXPENSES_PER_DAY days up to END_DATE
+    """
+    rng = random.Random(seed)
+    categories = list(CATEGORIES)
+    weights = [CATEGORIES[category][0] for category in categories]
+    days = max(1, rows // EXPENSES_PER_DAY)
+    start = END_DATE - datetime.timedelta(days=days - 1)
+
+    for i in range(rows):
+        category = rng.choices(categories, weights)[0]
+        _, names, typical, fixed = CATEGORIES[category]
+        cents = max(1, round(rng.lognormvariate(0, 0.5) * typical * 100))
+        yield {
+            "date": (start + datetime.timedelta(days=i * days // rows)).isoformat(),
+            "category": category,
+            "name": rng.choice(names),
+            "amount": Decimal(cents).scaleb(-2),
+            "fixed": 1 if fixed else 0,
+            "comment": rng.choice(COMMENTS),
+        }
+
+
+
+# =========================
+# timing
+# =========================
+def _summary(samples) -> dict:
+    """
+    return the min, median and mean of samples in seconds, as milliseconds
+    """
+    return {
+        "min_ms": min(samples) * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "samples": len(samples),
+    }
+
+
+def _time(function, repeat, setup=None) -> dict:
+    """
+    call setup() and then time function() repeat times, the cache is cleared first
+    an untimed first call warms up imports and the SQLite page cache
+    """
+    samples = []
+    for sample in range(repeat + 1):
+        if setup is not None:
+            setup()
+        db.clear_cache()
+        start = time.perf_counter()
+        function()
+        if sample:
+            samples.append(time.perf_counter() - start)
+    return _summary(samples)
+
+
+def bench_db(rows, repeat, seed=0) -> dict:
+    """
+    fill the current database with a synthetic ledger and time the db.py functions
+    """
+    results = {}
+    rng = random.Random(seed + 1)
+
+    ledger = list(generate_ledger(rows, seed))
+    start = time.perf_counter()
+    # the random ledger may repeat a date, name and amount, keep those rows too
+    result = db.add_expenses(ledger, allow_duplicates=True)
+    results["add_expenses"] = _summary([time.perf_counter() - start])
+    if result.inserted != rows or result.rejected:
+        raise RuntimeError(f"add_expenses inserted {result.inserted} of {rows} rows, {len(result.rejected)} rejected")
+
+    months = db.get_months()
+    last_month = months[0]
+    year_start, year_end = db.month_range(months[min(11, len(months) - 1)], last_month)
+    month_start, month_end = db.month_range(last_month)
+
+    def pages(count) -> None:
+        page, cursor = db.query_expenses(order_by="date", descending=True)
+        for _ in range(count - 1):
+            if cursor is None:
+                break
+            page, cursor = db.query_expenses(order_by="date", descending=True, after=cursor)
+
+    results["get_expenses"] = _time(db.get_expenses, repeat)
+    results["get_expenses(month)"] = _time(lambda: db.get_expenses(start_date=month_start, end_date=month_end), repeat)
+    results["iter_expenses"] = _time(lambda: sum(1 for _ in db.iter_expenses(raw=True)), repeat)
+    results["get_expense_frame"] = _time(db.get_expense_frame, repeat)
+    results["query_expenses(first page)"] = _time(lambda: pages(1), repeat)
+    results["query_expenses(10 pages)"] = _time(lambda: pages(10), repeat)
+    results["query_expenses(sorted by amount)"] = _time(lambda: db.query_expenses(order_by="amount", descending=True), repeat)
+    results["query_expenses(filtered)"] = _time(lambda: db.query_expenses(category="groceries", min_amount=50), repeat)
+    results["search_expenses"] = _time(lambda: db.search_expenses("super"), repeat)
+    results["get_categories"] = _time(db.get_categories, repeat)
+    results["get_months"] = _time(db.get_months, repeat)
+    results["aggregate_expenses(month, year)"] = _time(lambda: db.aggregate_expenses("month", start_date=year_start, end_date=year_end), repeat)
+    results["aggregate_expenses(week, all)"] = _time(lambda: db.aggregate_expenses("week"), repeat)
+
+    # writes take different expenses for every sample, deleted ones are not picked again
+    remaining = list(range(1, rows + 1))
+    rng.shuffle(remaining)
+    ids = []
+
+    def pick(count) -> None:
+        ids[:] = [remaining.pop() for _ in range(count)]
+
+    def edit_each() -> None:
+        for expense_id in ids:
+            db.edit_expense(expense_id, {**ledger[expense_id - 1], "amount": Decimal("12.34"), "comment": "edited"})
+
+    def delete_each() -> None:
+        for expense_id in ids:
+            db.delete_expense(expense_id)
+
+    results["find_duplicates"] = _time(db.find_duplicates, repeat)
+    results["add_expense x100"] = _time(lambda: [db.add_expense(expense, allow_duplicate=True) for expense in ledger[:100]], repeat)
+    edit_count, edit_batch, delete_count, delete_batch = WRITE_COUNTS
+    results[f"edit_expense x{edit_count}"] = _time(edit_each, repeat, lambda: pick(edit_count))
+    results[f"edit_expenses({edit_batch})"] = _time(lambda: db.edit_expenses((expense_id, {"category": "gifts"}) for expense_id in ids), repeat, lambda: pick(edit_batch))
+    results[f"delete_expense x{delete_count}"] = _time(delete_each, repeat, lambda: pick(delete_count))
+    results[f"delete_expenses({delete_batch})"] = _time(lambda: db.delete_expenses(ids), repeat, lambda: pick(delete_batch))
+    return results
+
+
+def bench_ui(repeat) -> dict:
+    """
+    time the window, the expenses table and the monthly chart on the current database
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    import ui
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    results = {}
+
+    def process_until(done, timeout=120) -> None:
+        deadline = time.perf_counter() + timeout
+        while not done():
+            if time.perf_counter() > deadline:
+                raise TimeoutError("UI benchmark timed out")
+            app.processEvents()
+            time.sleep(0.0005)
+
+    # the first page arrives through the event loop
+    loaded = []
+    windows = []
+
+    def create_window() -> None:
+        window = ui.Window()
+        window.expenses_model.page_loaded.connect(lambda: loaded.append(True))
+        window.show()
+        process_until(lambda: loaded)
+        windows.append(window)
+
+    results["Window (first page)"] = _time(create_window, repeat, loaded.clear)
+    window = windows[-1]
+
+    def populate() -> None:
+        window._populate_expenses_table()
+        process_until(lambda: loaded)
+
+    results["_populate_expenses_table"] = _time(populate, repeat, loaded.clear)
+
+    # the chart shows the last year of the ledger
+    months = db.get_months()
+    window._set_months(months)
+    window.month_to_input.setCurrentText(months[0])
+    window.month_from_input.setCurrentText(months[min(11, len(months) - 1)])
+
+    def monthly_chart() -> None:
+        window.monthly_content = window.create_monthly_content()
+        window.refresh_monthly_content()
+        process_until(lambda: window._monthly_chart_key is not None)
+        window.monthly_canvas.draw()
+
+    results["create_monthly_content (chart drawn)"] = _time(monthly_chart, repeat)
+
+    for window in windows:
+        window.db_executor.wait_for_done()
+        window.close()
+    app.processEvents()
+    return results
+
+
+def run(sizes, repeat, ui=True, seed=0) -> dict:
+    """
+    run the benchmarks for every ledger size, each on a fresh database
+    raise ValueError if a ledger is too small for the write benchmarks
+    """
+    needed = (repeat + 1) * sum(WRITE_COUNTS)
+    for rows in sizes:
+        if rows < needed:
+            raise ValueError(f"the write benchmarks need ledgers of at least {needed} rows with --repeat {repeat}, got {rows}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in sizes:
+            print(f"{rows} rows ...", file=sys.stderr)
+            db.set_db_path(os.path.join(directory, f"bench_{rows}.sqlite"))
+            db.create_table()
+            results[str(rows)] = bench_db(rows, repeat, seed)
+            if ui:
+                results[str(rows)].update(bench_ui(repeat))
+            db.close_connections()
+
+    return {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+
+# =========================
+# reporting
+# =========================
+def compare(current, baseline) -> list:
+    """
+    return (size, benchmark, baseline ms, current ms, ratio) for every benchmark in both runs
+    """
+    rows = []
+    for size, benchmarks in current["results"].items():
+        for name, stats in benchmarks.items():
+            base = baseline.get("results", {}).get(size, {}).get(name)
+            if base is None:
+                continue
+            ratio = stats["median_ms"] / base["median_ms"] if base["median_ms"] else float("inf")
+            rows.append((size, name, base["median_ms"], stats["median_ms"], ratio))
+    return rows
+
+
+def is_regression(row, threshold=THRESHOLD) -> bool:
+    """
+    return whether a compare() row is slower than the baseline beyond the noise
+    """
+    _, _, base, current, ratio = row
+    return ratio > threshold and current - base > MIN_DIFFERENCE_MS
+
+
+def print_results(current, comparison=None, threshold=THRESHOLD) -> None:
+    """
+    print the median timings, with the baseline and the ratio if there is one
+    """
+    rows = {(row[0], row[1]): row for row in comparison or []}
+    for size, benchmarks in current["results"].items():
+        print(f"\n{size} rows")
+        for name, stats in benchmarks.items():
+            line = f"  {name:<40} {stats['median_ms']:>10.2f} ms"
+            if (size, name) in rows:
+                row = rows[(size, name)]
+                flag = "  REGRESSION" if is_regression(row, threshold) else ""
+                line += f"   baseline {row[2]:>10.2f} ms   x{row[4]:.2f}{flag}"
+            print(line)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark MyFinanceLog on synthetic ledgers.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="ledger sizes in rows")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="samples per benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic ledgers")
+    parser.add_argument("--no-ui", action="store_true", help="skip the Qt benchmarks")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    try:
+        current = run(args.sizes, args.repeat, ui=not args.no_ui, seed=args.seed)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+
+    comparison = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare(current, json.load(f))
+    print_results(current, comparison, args.threshold)
+
+    regressions = [row for row in comparison or [] if is_regression(row, args.threshold)]
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
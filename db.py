@@ -1,14 +1,35 @@
 # db.py
 
 """
-Any changes to the database schema (e.g. adding, renaming, or removing columns)
-must be reflected consistently in the following places:
+The database schema is versioned with `PRAGMA user_version`. Any change to the
+schema (e.g. adding, renaming, or removing columns, or adding indexes) is made
+by appending a new migration function to `MIGRATIONS`; never edit a migration
+that has already been released. `create_table()` applies the pending
+migrations at startup, so existing database files are upgraded in place.
 
-- The `fields`, `__init__`, `__repr__`, and `__str__` methods of the `Expense` class
-- The SQL query in `create_table()`
-- The `__init__` method of the `ExpenseDialog` class
+Column changes must also be reflected in:
 
-All of these components rely on a consistent column structure.
+- `Expense.fields` and the `Expense.__init__` parameters
+- `ExpenseDialog.get_expense_data()` in ui.py
+
+or, for columns that are not expense attributes, in `INTERNAL_COLUMNS`.
+
+`check_schema()` runs after every migration and raises a `SchemaError` if the
+table columns, `Expense.fields` + `INTERNAL_COLUMNS` and `Expense.__init__`
+disagree, and the write functions reject expense dicts with keys that are not
+in `Expense.fields` (or `external_id`).
+
+Every expense has a fingerprint, a hash of its date, normalised name, amount
+and external transaction ID. Exactly one expense per fingerprint holds it
+(`duplicate = 0`, unique-indexed), so adding an expense that is already stored
+is caught with one index lookup. Rows kept as duplicates anyway are marked with
+`duplicate = 1` and reported by `find_duplicates()`; when the holder is deleted
+or edited to other content, a trigger hands the fingerprint to its oldest
+duplicate.
+
+Amounts are stored as INTEGER cents. `Expense.amount` is a `Decimal` in euros,
+`to_cents()` and `from_cents()` convert between the two. Raw rows, `ExpenseFrame`
+columns and aggregate totals are in cents, so sums stay exact integers.
 """
 
 
@@ -16,7 +37,127 @@ All of these components rely on a consistent column structure.
 # =========================
 # imports
 # =========================
+import atexit
+import calendar
+import hashlib
+import inspect
+import itertools
+import os
+import re
 import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+
+
+# =========================
+# configuration
+# =========================
+
+# path of the SQLite database file, can be overridden with the
+# MYFINANCELOG_DB environment variable or at runtime with set_db_path()
+DB_PATH = os.environ.get("MYFINANCELOG_DB", "expensesDB.sqlite")
+
+# pragmas applied to every new connection
+PRAGMAS = {
+    "journal_mode": "WAL",      # readers do not block the writer and vice versa
+    "synchronous": "NORMAL",    # safe with WAL, avoids an fsync per commit
+    "cache_size": -65536,       # page cache in KiB (64 MB)
+    "mmap_size": 268435456,     # memory-mapped I/O (256 MB)
+    "temp_store": "MEMORY",
+}
+
+# number of prepared statements kept per connection
+STATEMENT_CACHE_SIZE = 256
+
+# default number of rows sent to executemany() per chunk in batch writes
+BATCH_CHUNK_SIZE = 1000
+
+# default number of rows returned per page by query_expenses()
+PAGE_SIZE = 200
+
+# default number of rows fetched from the cursor at a time by iter_expenses()
+ITER_ARRAYSIZE = 1000
+
+# maximum number of entries in the read-through cache
+CACHE_SIZE = 1024
+
+# largest amount in cents an INTEGER column can store
+MAX_CENTS = 2 ** 63 - 1
+
+# columns of the expenses table that are not Expense attributes
+# external_id: transaction ID of an imported expense, may be given in expense dicts
+# fingerprint: set by the write functions, see expense_fingerprint()
+# duplicate: 1 if another expense holds the fingerprint
+INTERNAL_COLUMNS = ["external_id", "fingerprint", "duplicate"]
+
+# expense fields the fingerprint is made of, besides the external ID
+FINGERPRINT_FIELDS = ("date", "name", "amount")
+
+# number of fingerprints looked up per query
+FINGERPRINT_LOOKUP_SIZE = 500
+
+
+# =========================
+# money
+# =========================
+
+def to_cents(amount) -> int:
+    """
+    amount: euros as Decimal, int, float or string ("12.34" or "12,34")
+    return the amount in cents, rounded half away from zero
+    """
+    try:
+        value = Decimal(str(amount).strip().replace(",", "."))
+        cents = (value * 100).quantize(Decimal(1), ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError(f"invalid amount: {amount!r}") from None
+    if not cents.is_finite():
+        raise ValueError(f"invalid amount: {amount!r}")
+    if abs(cents) > MAX_CENTS:
+        raise ValueError(f"amount out of range: {amount!r}")
+    return int(cents)
+
+
+def from_cents(cents) -> Decimal:
+    """
+    return an amount in cents as Decimal euros
+    """
+    return Decimal(cents).scaleb(-2)
+
+
+def parse_amount(text) -> Decimal:
+    """
+    parse user input like "12.34" or "12,34" into Decimal euros
+    raise ValueError for invalid input
+    """
+    return from_cents(to_cents(text))
+
+
+
+# =========================
+# fingerprints
+# =========================
+
+def normalise_name(name) -> str:
+    """
+    return an expense name folded for comparison: case, Unicode forms and
+    whitespace differences are ignored
+    """
+    return " ".join(unicodedata.normalize("NFKC", name or "").casefold().split())
+
+
+def expense_fingerprint(date, name, cents, external_id=None) -> str:
+    """
+    return the content fingerprint of an expense, amount in cents
+    two expenses with the same fingerprint are the same transaction
+    """
+    key = "\x1f".join((str(date), normalise_name(name), str(cents), external_id or ""))
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
 
 
 # =========================
@@ -28,6 +169,7 @@ class Expense:
     """
     
     fields = ["id", "date", "category", "name", "amount", "fixed", "comment"]
+    __slots__ = tuple(fields)
     
     def __init__(self, id, date, category, name, amount, fixed, comment):
         self.id = id
@@ -53,144 +195,1338 @@ class Expense:
             comment=data.get("comment", "")
         )
     
+    @classmethod
+    def from_row(cls, row):
+        """
+        create an Expense object from a database row in fields order
+        """
+        id, date, category, name, cents, fixed, comment = row
+        return cls(id, date, category, name, from_cents(cents), fixed, comment)
+    
+    @property
+    def cents(self) -> int:
+        """
+        the amount in cents
+        """
+        return to_cents(self.amount)
+    
     def __repr__(self):
-        return f"Expense(id={self.id}, date={self.date}, category={self.category}, name={self.name}, amount={self.amount}, fixed={self.fixed}, comment={self.comment})"
+        values = ", ".join(f"{field}={getattr(self, field)}" for field in self.fields)
+        return f"Expense({values})"
     
     def __str__(self):
-        return f"{self.id} | {self.date} | {self.category} | {self.name} | {self.amount} | {'Fixed' if self.fixed else 'Variable'} | {self.comment}"
+        values = [
+            ("Fixed" if self.fixed else "Variable") if field == "fixed" else str(getattr(self, field))
+            for field in self.fields
+        ]
+        return " | ".join(values)
+
+
+class BatchResult:
+    """
+    outcome of a batch write: the number of inserted rows, the rejected
+    input rows as (index, item, reason) tuples and the input rows that were
+    not inserted because they duplicate a stored expense, as (index, item)
+    """
+    
+    def __init__(self):
+        self.inserted = 0
+        self.rejected = []
+        self.duplicates = []
+    
+    def __repr__(self):
+        return f"BatchResult(inserted={self.inserted}, rejected={len(self.rejected)}, duplicates={len(self.duplicates)})"
+
+
+class ExpenseFrame:
+    """
+    column-oriented, compact collection of expenses
+    numeric columns are stored in contiguous arrays, text columns in lists
+    """
+    
+    # array typecodes of the numeric columns, amounts are in cents
+    typecodes = {"id": "q", "amount": "q", "fixed": "b"}
+    
+    def __init__(self):
+        self.columns = {
+            field: array(self.typecodes[field]) if field in self.typecodes else []
+            for field in Expense.fields
+        }
+    
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        create an ExpenseFrame from rows in Expense.fields order
+        """
+        frame = cls()
+        columns = [frame.columns[field] for field in Expense.fields]
+        for row in rows:
+            for column, value in zip(columns, row):
+                column.append(value)
+        return frame
+    
+    def __len__(self):
+        return len(self.columns["id"])
+    
+    def __getitem__(self, index):
+        return Expense.from_row([self.columns[field][index] for field in Expense.fields])
+    
+    def __iter__(self):
+        for row in zip(*(self.columns[field] for field in Expense.fields)):
+            yield Expense.from_row(row)
+    
+    def __repr__(self):
+        return f"ExpenseFrame(rows={len(self)})"
+    
+    def column(self, field):
+        """
+        return a column without copying it,
+        a read-only memoryview for numeric columns and the list for text columns
+        """
+        if field in self.typecodes:
+            return memoryview(self.columns[field]).toreadonly()
+        return self.columns[field]
+    
+    def sum(self, field="amount"):
+        """
+        return the sum of a numeric column, amounts in cents
+        """
+        return sum(self.columns[field])
+    
+    def to_numpy(self, field):
+        """
+        return a numeric column as a NumPy array sharing the column's memory
+        numpy is optional and only imported here, importing db.py stays cheap
+        """
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("ExpenseFrame.to_numpy() requires numpy") from None
+        column = self.columns[field]
+        array_view = numpy.frombuffer(column, dtype=numpy.dtype(column.typecode))
+        array_view.flags.writeable = False
+        return array_view
+
+
+class LRUCache:
+    """
+    thread-safe least recently used cache with hit and miss counters
+    keys are tuples whose first item is a namespace, e.g. ("expense", 42)
+    every invalidation bumps version, the data version of the cached data
+    """
+    
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.version = 0
+        self.hits = {}
+        self.misses = {}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        """
+        return the cached value for key and mark it as recently used
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits[key[0]] = self.hits.get(key[0], 0) + 1
+                return self._entries[key]
+            self.misses[key[0]] = self.misses.get(key[0], 0) + 1
+            return default
+    
+    def put(self, key, value, version):
+        """
+        cache value for key, unless the data changed since version was read
+        """
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, namespaces=(), keys=()) -> None:
+        """
+        bump the data version and drop the given keys and all keys in namespaces
+        """
+        with self._lock:
+            self.version += 1
+            for key in keys:
+                self._entries.pop(key, None)
+            if namespaces:
+                for key in [key for key in self._entries if key[0] in namespaces]:
+                    del self._entries[key]
+    
+    def clear(self) -> None:
+        """
+        bump the data version and drop all entries
+        """
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+    
+    def stats(self) -> dict:
+        """
+        return the cache size, data version and hit/miss counters per namespace
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "data_version": self.version,
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+            }
+
+
+class SchemaError(Exception):
+    """
+    raised when the database schema and the Expense class do not match
+    """
+
+
+class DuplicateExpenseError(Exception):
+    """
+    raised by add_expense() when the expense has the fingerprint of a stored one
+    """
+    
+    def __init__(self, duplicate_of):
+        super().__init__(f"the expense duplicates expense {duplicate_of}")
+        self.duplicate_of = duplicate_of
 
 
 
 # =========================
-# database functions
+# connections
 # =========================
 
+# connections are kept open and reused, one per thread
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+_generation = 0
+
+
+def _open_connection(path) -> sqlite3.Connection:
+    """
+    open a new connection to the database at path and apply the pragmas
+    """
+    conn = sqlite3.connect(
+        path,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False,    # only needed so close_connections() can close it
+    )
+    for pragma, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    return conn
+
+
 def get_connection() -> sqlite3.Connection:
     """
-    return connection to the SQLite database
+    return the connection to the SQLite database for the calling thread
+    the connection is opened on first use and reused by later calls
     """
-    return sqlite3.connect("expensesDB.sqlite")
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.generation != _generation:
+        conn = _open_connection(DB_PATH)
+        with _connections_lock:
+            _connections.append(conn)
+            _local.conn = conn
+            _local.generation = _generation
+    return conn
 
 
-def create_table() -> None:
+def close_connections() -> None:
     """
-    create the expenses table in the database if it does not exist
+    close all open connections, threads will reconnect on their next call
     """
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS expenses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,
-                category TEXT NOT NULL,
-                name TEXT,
-                amount REAL NOT NULL,
-                fixed BOOLEAN NOT NULL,
-                comment TEXT
+    global _generation
+    with _connections_lock:
+        _generation += 1
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+
+
+def set_db_path(path) -> None:
+    """
+    point the module to another database file
+    note: ":memory:" gives every thread its own, separate database
+    """
+    global DB_PATH
+    close_connections()
+    DB_PATH = path
+    _cache.clear()
+
+
+atexit.register(close_connections)
+
+
+
+# =========================
+# cache
+# =========================
+
+# read-through cache for categories, months, column names, single expenses and aggregates
+# only writes made through this module invalidate it
+_cache = LRUCache(CACHE_SIZE)
+_MISSING = object()
+
+# namespaces that any write to the expenses table can change
+_DERIVED_NAMESPACES = ("categories", "months", "aggregate")
+
+
+def _cached(key, load):
+    """
+    return the cached value for key, or load and cache it
+    """
+    version = _cache.version
+    value = _cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = load()
+        if value is not None:
+            _cache.put(key, value, version)
+    return value
+
+
+def get_data_version() -> int:
+    """
+    return a counter that changes whenever expenses are added, edited or deleted
+    """
+    return _cache.version
+
+
+def cache_stats() -> dict:
+    """
+    return the hit and miss counters of the read-through cache
+    """
+    return _cache.stats()
+
+
+def clear_cache() -> None:
+    """
+    drop all cached entries, e.g. after the database was changed by another process
+    """
+    _cache.clear()
+
+
+
+# =========================
+# schema migrations
+# =========================
+
+def _migration_1(conn) -> None:
+    """
+    create the expenses table
+    (databases created before versioning already have it)
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            category TEXT NOT NULL,
+            name TEXT,
+            amount REAL NOT NULL,
+            fixed BOOLEAN NOT NULL,
+            comment TEXT
+        )
+    """)
+
+
+def _migration_2(conn) -> None:
+    """
+    add indexes for date range, category and fixed/variable lookups
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expenses_category_date ON expenses (category, date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expenses_fixed_date ON expenses (fixed, date)")
+
+
+def _migration_3(conn) -> None:
+    """
+    store amounts as INTEGER cents instead of REAL euros
+    SQLite cannot change a column type in place, so the table is rebuilt
+    """
+    conn.execute("""
+        CREATE TABLE expenses_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            category TEXT NOT NULL,
+            name TEXT,
+            amount INTEGER NOT NULL,
+            fixed BOOLEAN NOT NULL,
+            comment TEXT
+        )
+    """)
+    conn.execute("""
+        INSERT INTO expenses_new (id, date, category, name, amount, fixed, comment)
+        SELECT id, date, category, name, CAST(ROUND(amount * 100) AS INTEGER), fixed, comment
+        FROM expenses
+    """)
+    
+    # keep the AUTOINCREMENT counter, so IDs of deleted rows are not reused
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'expenses'").fetchone()
+    conn.execute("DROP TABLE expenses")
+    conn.execute("ALTER TABLE expenses_new RENAME TO expenses")
+    if sequence:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'expenses'", sequence)
+    
+    # the indexes were dropped with the old table
+    _migration_2(conn)
+
+
+def _migration_4(conn) -> None:
+    """
+    add the expense_totals summary table with per month, category and
+    fixed/variable totals, kept up to date by triggers on the expenses table
+    """
+    conn.execute("""
+        CREATE TABLE expense_totals (
+            month TEXT NOT NULL,
+            category TEXT NOT NULL,
+            fixed BOOLEAN NOT NULL,
+            total INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (month, category, fixed)
+        ) WITHOUT ROWID
+    """)
+    
+    add_new = """
+        INSERT INTO expense_totals (month, category, fixed, total, count)
+        VALUES (substr(NEW.date, 1, 7), NEW.category, NEW.fixed, NEW.amount, 1)
+        ON CONFLICT (month, category, fixed)
+        DO UPDATE SET total = total + excluded.total, count = count + 1;
+    """
+    remove_old = """
+        UPDATE expense_totals SET total = total - OLD.amount, count = count - 1
+        WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category AND fixed = OLD.fixed;
+        DELETE FROM expense_totals
+        WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category AND fixed = OLD.fixed AND count = 0;
+    """
+    conn.execute(f"CREATE TRIGGER expense_totals_insert AFTER INSERT ON expenses BEGIN {add_new} END")
+    conn.execute(f"CREATE TRIGGER expense_totals_delete AFTER DELETE ON expenses BEGIN {remove_old} END")
+    conn.execute(f"""
+        CREATE TRIGGER expense_totals_update AFTER UPDATE OF date, category, amount, fixed ON expenses
+        BEGIN {remove_old} {add_new} END
+    """)
+    
+    _rebuild_totals(conn)
+
+
+def _migration_5(conn) -> None:
+    """
+    add the expenses_fts full-text index over name, comment and category,
+    kept in sync with the expenses table by triggers
+    skipped if SQLite was built without FTS5, search_expenses() then falls back to LIKE
+    """
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE expenses_fts USING fts5(
+                name, comment, category,
+                content = 'expenses',
+                content_rowid = 'id',
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
             )
         """)
-        conn.commit()
+    except sqlite3.OperationalError:
+        return
+    
+    add_new = """
+        INSERT INTO expenses_fts (rowid, name, comment, category)
+        VALUES (NEW.id, NEW.name, NEW.comment, NEW.category);
+    """
+    remove_old = """
+        INSERT INTO expenses_fts (expenses_fts, rowid, name, comment, category)
+        VALUES ('delete', OLD.id, OLD.name, OLD.comment, OLD.category);
+    """
+    conn.execute(f"CREATE TRIGGER expenses_fts_insert AFTER INSERT ON expenses BEGIN {add_new} END")
+    conn.execute(f"CREATE TRIGGER expenses_fts_delete AFTER DELETE ON expenses BEGIN {remove_old} END")
+    conn.execute(f"""
+        CREATE TRIGGER expenses_fts_update AFTER UPDATE OF name, comment, category ON expenses
+        BEGIN {remove_old} {add_new} END
+    """)
+    conn.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+
+
+def _migration_6(conn) -> None:
+    """
+    add indexes for sorting the expenses table by any column
+    (the rowid is part of every index, so ties are already ordered by id)
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expenses_amount ON expenses (amount)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses (category)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expenses_fixed ON expenses (fixed)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expenses_name ON expenses (COALESCE(name, ''))")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expenses_comment ON expenses (COALESCE(comment, ''))")
+
+
+def _migration_7(conn) -> None:
+    """
+    add the categories summary table with the number of expenses and the latest
+    expense date per category, kept up to date by triggers on the expenses table
+    """
+    conn.execute("""
+        CREATE TABLE categories (
+            name TEXT PRIMARY KEY,
+            usage_count INTEGER NOT NULL,
+            last_used TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+    
+    add_new = """
+        INSERT INTO categories (name, usage_count, last_used)
+        VALUES (NEW.category, 1, NEW.date)
+        ON CONFLICT (name) DO UPDATE SET
+            usage_count = usage_count + 1,
+            last_used = MAX(last_used, excluded.last_used);
+    """
+    # last_used is not lowered on delete, it stays the latest date the category was used
+    remove_old = """
+        UPDATE categories SET usage_count = usage_count - 1 WHERE name = OLD.category;
+        DELETE FROM categories WHERE name = OLD.category AND usage_count <= 0;
+    """
+    conn.execute(f"CREATE TRIGGER categories_insert AFTER INSERT ON expenses BEGIN {add_new} END")
+    conn.execute(f"CREATE TRIGGER categories_delete AFTER DELETE ON expenses BEGIN {remove_old} END")
+    conn.execute(f"""
+        CREATE TRIGGER categories_update AFTER UPDATE OF category, date ON expenses
+        BEGIN {remove_old} {add_new} END
+    """)
+    _rebuild_categories(conn)
+
+
+def _migration_8(conn) -> None:
+    """
+    add the external_id, fingerprint and duplicate columns and fingerprint the
+    existing expenses, duplicates are marked in the duplicate column so the
+    fingerprint of a deleted or edited expense can be handed over to its
+    oldest duplicate by triggers
+    """
+    conn.execute("ALTER TABLE expenses ADD COLUMN external_id TEXT")
+    conn.execute("ALTER TABLE expenses ADD COLUMN fingerprint TEXT")
+    conn.execute("ALTER TABLE expenses ADD COLUMN duplicate INTEGER NOT NULL DEFAULT 0")
+    _rebuild_fingerprints(conn)
+    conn.execute("CREATE UNIQUE INDEX idx_expenses_fingerprint ON expenses(fingerprint) WHERE duplicate = 0")
+    conn.execute("CREATE INDEX idx_expenses_duplicates ON expenses(fingerprint, duplicate, id)")
+
+    hand_over = """
+        UPDATE expenses SET duplicate = 0 WHERE id = (
+            SELECT MIN(id) FROM expenses WHERE fingerprint = OLD.fingerprint AND duplicate = 1
+        );
+    """
+    conn.execute(f"CREATE TRIGGER expenses_fingerprint_delete AFTER DELETE ON expenses WHEN OLD.duplicate = 0 BEGIN {hand_over} END")
+    conn.execute(f"""
+        CREATE TRIGGER expenses_fingerprint_update AFTER UPDATE OF fingerprint ON expenses
+        WHEN OLD.duplicate = 0 AND NEW.fingerprint IS NOT OLD.fingerprint
+        BEGIN {hand_over} END
+    """)
+
+
+# migration n upgrades the schema from user_version n-1 to n, append only
+MIGRATIONS = [
+    _migration_1,
+    _migration_2,
+    _migration_3,
+    _migration_4,
+    _migration_5,
+    _migration_6,
+    _migration_7,
+    _migration_8,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version() -> int:
+    """
+    return the schema version of the database
+    """
+    return get_connection().execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate() -> int:
+    """
+    apply all pending migrations, each in its own transaction
+    return the schema version of the database afterwards
+    """
+    conn = get_connection()
+
+    # an up-to-date database is only read, so starting the application or a
+    # report does not wait for a writer holding the lock
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    while version < SCHEMA_VERSION:
+        with conn:
+            # take the write lock first, so concurrent processes don't
+            # apply the same migration twice
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                break   # migrated by another process in the meantime
+            MIGRATIONS[version](conn)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+        _cache.clear()
+    
+    if version > SCHEMA_VERSION:
+        raise SchemaError(f"database schema version {version} is newer than supported version {SCHEMA_VERSION}")
+    check_schema()
+    return version
+
+
+def check_schema() -> None:
+    """
+    verify that the expenses table, Expense.fields + INTERNAL_COLUMNS and Expense.__init__ agree
+    raise a SchemaError otherwise
+    """
+    with get_connection() as conn:
+        columns = [info[1] for info in conn.execute("PRAGMA table_info(expenses)")]
+    parameters = list(inspect.signature(Expense.__init__).parameters)[1:]
+    
+    if columns != Expense.fields + INTERNAL_COLUMNS:
+        raise SchemaError(f"expenses table columns {columns} do not match Expense.fields {Expense.fields} + {INTERNAL_COLUMNS}")
+    if parameters != Expense.fields:
+        raise SchemaError(f"Expense.__init__ parameters {parameters} do not match Expense.fields {Expense.fields}")
+
+
+def _check_fields(expense_data) -> None:
+    """
+    raise a SchemaError if the expense dict has keys that are not columns
+    """
+    unknown = set(expense_data) - set(Expense.fields) - {"external_id"}
+    if unknown:
+        raise SchemaError(f"unknown expense fields: {', '.join(sorted(unknown))}")
+
+
+
+def _rebuild_totals(conn) -> None:
+    """
+    recompute the expense_totals summary table from the expenses table
+    """
+    conn.execute("DELETE FROM expense_totals")
+    conn.execute("""
+        INSERT INTO expense_totals (month, category, fixed, total, count)
+        SELECT substr(date, 1, 7), category, fixed, SUM(amount), COUNT(*)
+        FROM expenses
+        GROUP BY substr(date, 1, 7), category, fixed
+    """)
+
+
+def _rebuild_categories(conn) -> None:
+    """
+    recompute the categories summary table from the expenses table
+    """
+    conn.execute("DELETE FROM categories")
+    conn.execute("""
+        INSERT INTO categories (name, usage_count, last_used)
+        SELECT category, COUNT(*), MAX(date)
+        FROM expenses
+        GROUP BY category
+    """)
+
+
+def _rebuild_fingerprints(conn) -> None:
+    """
+    recompute the fingerprints of all expenses, the first of several
+    expenses with the same fingerprint holds it, the others are duplicates
+    """
+    # mark every row first, so the unique index never sees two holders
+    # and the hand-over triggers do not fire
+    conn.execute("UPDATE expenses SET duplicate = 1")
+    seen = set()
+    rows = []
+    for expense_id, date, name, cents, external_id in conn.execute("SELECT id, date, name, amount, external_id FROM expenses ORDER BY id"):
+        fingerprint = expense_fingerprint(date, name, cents, external_id)
+        rows.append((fingerprint, int(fingerprint in seen), expense_id))
+        seen.add(fingerprint)
+    conn.executemany("UPDATE expenses SET fingerprint = ?, duplicate = ? WHERE id = ?", rows)
+
+
+def rebuild_totals() -> None:
+    """
+    recompute the expense_totals and categories summary tables and the fingerprints,
+    for recovery if they ever get out of sync with the expenses table
+    """
+    with get_connection() as conn:
+        _rebuild_totals(conn)
+        _rebuild_categories(conn)
+        _rebuild_fingerprints(conn)
+    _cache.invalidate(_DERIVED_NAMESPACES)
+
+
+
+# =========================
+# database functions
+# =========================
+
+def create_table() -> None:
+    """
+    create the expenses table or upgrade it to the current schema version
+    """
+    migrate()
         
 
-def get_expenses() -> list:
+def _where_clause(start_date=None, end_date=None, category=None, fixed=None, min_amount=None, max_amount=None) -> tuple:
+    """
+    build the WHERE clause and its parameters for the expense filters
+    start_date, end_date: "yyyy-MM-dd", both inclusive
+    category: a category or a list of categories
+    fixed: True for fixed, False for variable expenses
+    min_amount, max_amount: amounts in euros, both inclusive
+    """
+    conditions = []
+    params = []
+    
+    if start_date is not None:
+        conditions.append("date >= ?")
+        params.append(str(start_date))
+    if end_date is not None:
+        conditions.append("date <= ?")
+        params.append(str(end_date))
+    if isinstance(category, str):
+        conditions.append("category = ?")
+        params.append(category)
+    elif category is not None:
+        category = list(category)
+        conditions.append(f"category IN ({', '.join(['?'] * len(category))})")
+        params.extend(category)
+    if fixed is not None:
+        conditions.append("fixed = ?")
+        params.append(1 if fixed else 0)
+    if min_amount is not None:
+        conditions.append("amount >= ?")
+        params.append(to_cents(min_amount))
+    if max_amount is not None:
+        conditions.append("amount <= ?")
+        params.append(to_cents(max_amount))
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, params
+
+
+def _select_sql(where="") -> str:
+    """
+    return the SELECT statement for expense rows, columns in Expense.fields order
+    """
+    return f"SELECT {', '.join(Expense.fields)} FROM expenses {where}"
+
+
+def get_expenses(**filters) -> list:
     """
     get all expenses from the database
+    optional filters: start_date, end_date, category, fixed, min_amount, max_amount (see _where_clause)
     """
     with get_connection() as conn:
         cursor = conn.cursor()
         
-        # retrieve all rows from the expenses table
-        sql = "SELECT * FROM expenses"
-        cursor.execute(sql)
+        # retrieve all matching rows from the expenses table
+        where, params = _where_clause(**filters)
+        sql = _select_sql(where)
+        cursor.execute(sql, params)
         rows = cursor.fetchall()
         
         # convert rows to Expense objects
         expenses = []
         for row in rows:
-            expense = Expense(*row)
+            expense = Expense.from_row(row)
             expenses.append(expense)
         
         return expenses
 
 
+def iter_expenses(order_by="id", descending=False, arraysize=ITER_ARRAYSIZE, raw=False, **filters):
+    """
+    lazily yield expenses, fetching arraysize rows from the cursor at a time
+    raw: yield plain tuples in Expense.fields order instead of Expense objects
+    optional filters: start_date, end_date, category, fixed, min_amount, max_amount (see _where_clause)
+    the rows come from a single read snapshot taken on the first fetch
+    """
+    where, params = _where_clause(**filters)
+    direction = "DESC" if descending else "ASC"
+    sql = f"{_select_sql(where)} ORDER BY {_sort_key(order_by)} {direction}, id {direction}"
+    
+    cursor = get_connection().cursor()
+    cursor.arraysize = arraysize
+    try:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany():
+            if raw:
+                yield from rows
+            else:
+                for row in rows:
+                    yield Expense.from_row(row)
+    finally:
+        cursor.close()
+
+
+def count_expenses(**filters) -> int:
+    """
+    count the expenses passing the filters
+    optional filters: start_date, end_date, category, fixed, min_amount, max_amount (see _where_clause)
+    """
+    where, params = _where_clause(**filters)
+    with get_connection() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM expenses {where}", params).fetchone()[0]
+
+
+def get_expense_frame(**filters) -> ExpenseFrame:
+    """
+    get all expenses as an ExpenseFrame
+    optional filters: start_date, end_date, category, fixed, min_amount, max_amount (see _where_clause)
+    """
+    return ExpenseFrame.from_rows(iter_expenses(raw=True, **filters))
+
+
 def get_expense_by_id(expense_id) -> Expense | None:
     """
     get an expense entry from the database by its ID
     """
+    def load():
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            sql = _select_sql("WHERE id = ?")
+            cursor.execute(sql, (expense_id,))
+            row = cursor.fetchone()
+            return Expense.from_row(row) if row else None
+    
+    expense = _cached(("expense", expense_id), load)
+    if expense is None:
+        # if no expense is found, return None and print error message
+        print(f"Expense with ID {expense_id} not found.")
+    return expense
+
+
+def _sort_key(order_by) -> str:
+    """
+    return the ORDER BY expression for a column
+    nullable text columns are sorted as empty strings,
+    so keyset comparisons never meet a NULL
+    """
+    if order_by not in Expense.fields:
+        raise ValueError(f"cannot order by {order_by}")
+    return f"COALESCE({order_by}, '')" if order_by in ("name", "comment") else order_by
+
+
+def query_expenses(order_by="date", descending=False, limit=PAGE_SIZE, after=None, **filters) -> tuple:
+    """
+    get one page of expenses, sorted by order_by (ties broken by id)
+    optional filters: start_date, end_date, category, fixed, min_amount, max_amount (see _where_clause)
+    after: the cursor returned with the previous page, None for the first page
+    return (expenses, cursor), cursor is None on the last page
+    """
+    sort_key = _sort_key(order_by)
+    direction = "DESC" if descending else "ASC"
+    where, params = _where_clause(**filters)
+    
+    # keyset pagination: continue after the last (sort value, id) seen
+    if after is not None:
+        comparison = "<" if descending else ">"
+        condition = f"id {comparison} ?" if order_by == "id" else f"({sort_key}, id) {comparison} (?, ?)"
+        where = f"{where} AND {condition}" if where else f"WHERE {condition}"
+        params += [after[1]] if order_by == "id" else list(after)
+    
+    sql = f"{_select_sql(where)} ORDER BY {sort_key} {direction}, id {direction} LIMIT ?"
     with get_connection() as conn:
-        cursor = conn.cursor()
-        sql = "SELECT * FROM expenses WHERE id = ?"
-        cursor.execute(sql, (expense_id,))
-        row = cursor.fetchone()
-        
-        if row:
-            return Expense(*row)
+        # fetch one extra row to know whether there is a next page
+        rows = conn.execute(sql, params + [limit + 1]).fetchall()
+    
+    expenses = [Expense.from_row(row) for row in rows[:limit]]
+    cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        value = last[Expense.fields.index(order_by)]
+        cursor = (value if value is not None else "", last[0])
+    return expenses, cursor
+
+
+def _has_fts(conn) -> bool:
+    """
+    return whether the database has the expenses_fts full-text index
+    """
+    sql = "SELECT 1 FROM sqlite_master WHERE name = 'expenses_fts'"
+    return conn.execute(sql).fetchone() is not None
+
+
+def search_expenses(query, order_by=None, descending=False, limit=PAGE_SIZE, offset=0, **filters) -> list:
+    """
+    full-text search over the name, comment and category of the expenses
+    every word of query has to match the start of a word, e.g. "sup mar" finds "Supermarket"
+    order_by: a column to sort the results by, None to rank them by relevance
+    optional filters: start_date, end_date, category, fixed, min_amount, max_amount (see _where_clause)
+    return up to limit expenses, skipping the first offset
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return []
+    where, params = _where_clause(**filters)
+    
+    if order_by is None:
+        direction = "DESC"
+        order = "search_rank, date DESC, id DESC"
+    else:
+        direction = "DESC" if descending else "ASC"
+        order = f"{_sort_key(order_by)} {direction}, id {direction}"
+    
+    with get_connection() as conn:
+        if _has_fts(conn):
+            # the filters apply to the expenses columns, not the index columns of the same name
+            source = """(
+                SELECT e.*, expenses_fts.rank AS search_rank FROM expenses_fts
+                JOIN expenses e ON e.id = expenses_fts.rowid
+                WHERE expenses_fts MATCH ?
+            )"""
+            params = [" ".join(f'"{word}"*' for word in words)] + params
         else:
-            # if no expense is found, return None and print error message
-            print(f"Expense with ID {expense_id} not found.")
-            return None
+            # without FTS5 every word has to appear in one of the columns
+            condition = "(name LIKE ? OR comment LIKE ? OR category LIKE ?)"
+            source = f"""(
+                SELECT *, 0 AS search_rank FROM expenses
+                WHERE {' AND '.join([condition] * len(words))}
+            )"""
+            params = [f"%{word}%" for word in words for _ in range(3)] + params
+        sql = f"SELECT {', '.join(Expense.fields)} FROM {source} {where} ORDER BY {order} LIMIT ? OFFSET ?"
+        rows = conn.execute(sql, params + [limit, offset]).fetchall()
+    
+    return [Expense.from_row(row) for row in rows]
+
+
+# SQL expressions mapping the date column to its period for each granularity
+_PERIODS = {
+    "day": "date",
+    "week": "strftime('%Y-W%W', date)",
+    "month": "substr(date, 1, 7)",
+    "year": "substr(date, 1, 4)",
+}
+
+
+def month_range(start_month, end_month=None) -> tuple:
+    """
+    start_month, end_month: "yyyy-MM"
+    return the (start_date, end_date) filters covering the months, both inclusive
+    """
+    return f"{start_month}-01", f"{end_month or start_month}-31"
+
+
+def _whole_months(start_date=None, end_date=None) -> bool:
+    """
+    return whether a date range starts and ends on month boundaries
+    """
+    if start_date is not None and not str(start_date).endswith("-01"):
+        return False
+    if end_date is not None:
+        end_date = str(end_date)
+        last_day = calendar.monthrange(int(end_date[:4]), int(end_date[5:7]))[1]
+        if end_date[8:] < f"{last_day:02d}":
+            return False
+    return True
+
+
+def aggregate_expenses(granularity="month", group_by=("category",), **filters) -> list:
+    """
+    sum up expenses in SQLite, grouped by period and the columns in group_by
+    granularity: "day", "week", "month" or "year"
+    group_by: any of "category" and "fixed"
+    optional filters: start_date, end_date, category, fixed, min_amount, max_amount (see _where_clause)
+    return a list of (period, *group_by values, total, count) tuples ordered by period,
+    totals in cents
+    monthly and yearly totals over whole months are read from the expense_totals
+    summary table, everything else is summed up from the expenses table
+    """
+    if granularity not in _PERIODS:
+        raise ValueError(f"unknown granularity {granularity}")
+    if not set(group_by) <= {"category", "fixed"}:
+        raise ValueError(f"cannot group by {', '.join(group_by)}")
+    
+    start_date = filters.pop("start_date", None)
+    end_date = filters.pop("end_date", None)
+    # the summary table has no amounts per expense to filter on
+    amount_filtered = filters.get("min_amount") is not None or filters.get("max_amount") is not None
+    if granularity in ("month", "year") and _whole_months(start_date, end_date) and not amount_filtered:
+        source, period, total, count = "expense_totals", "month", "SUM(total)", "SUM(count)"
+        where, params = _where_clause(**filters)
+        conditions = [where[len("WHERE "):]] if where else []
+        if start_date is not None:
+            conditions.append("month >= ?")
+            params.append(str(start_date)[:7])
+        if end_date is not None:
+            conditions.append("month <= ?")
+            params.append(str(end_date)[:7])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        if granularity == "year":
+            period = "substr(month, 1, 4)"
+    else:
+        source, period, total, count = "expenses", _PERIODS[granularity], "SUM(amount)", "COUNT(*)"
+        where, params = _where_clause(start_date=start_date, end_date=end_date, **filters)
+    
+    columns = [f"{period} AS period", *group_by]
+    groups = ", ".join(["period", *group_by])
+    sql = f"""
+        SELECT {', '.join(columns)}, {total}, {count}
+        FROM {source} {where}
+        GROUP BY {groups}
+        ORDER BY {groups}
+    """
+    
+    def load():
+        with get_connection() as conn:
+            return conn.execute(sql, params).fetchall()
+    
+    return list(_cached(("aggregate", sql, tuple(params)), load))
+
+
+def _chunked(iterable, size):
+    """
+    yield lists of up to size items from iterable
+    """
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def _expense_values(expense, fields) -> list:
+    """
+    expense: Expense or dict
+    return the values of the given fields, raise ValueError if the row
+    would violate the table constraints
+    """
+    if isinstance(expense, dict):
+        _check_fields(expense)
+        expense = Expense.from_dict(expense)
+    for field in ("date", "category", "amount", "fixed"):
+        if getattr(expense, field) is None:
+            raise ValueError(f"{field} is required")
+    return [expense.cents if k == "amount" else getattr(expense, k) for k in fields]
+
+
+def _row_fingerprint(expense, fields, values) -> tuple:
+    """
+    expense: Expense or dict, values: its values of the given fields
+    return the external ID and the fingerprint of the row
+    """
+    external_id = expense.get("external_id") if isinstance(expense, dict) else None
+    date, name, cents = (values[fields.index(field)] for field in FINGERPRINT_FIELDS)
+    return external_id, expense_fingerprint(date, name, cents, external_id)
+
+
+def _refresh_fingerprints(conn, expense_ids) -> None:
+    """
+    recompute the fingerprints of edited expenses, an expense that now matches
+    another one becomes a duplicate and is reported by find_duplicates()
+    a fingerprint the edit releases is handed over by the expenses_fingerprint_update trigger
+    """
+    for chunk in _chunked(expense_ids, FINGERPRINT_LOOKUP_SIZE):
+        sql = f"SELECT id, date, name, amount, external_id FROM expenses WHERE id IN ({', '.join(['?'] * len(chunk))})"
+        for expense_id, date, name, cents, external_id in conn.execute(sql, chunk).fetchall():
+            fingerprint = expense_fingerprint(date, name, cents, external_id)
+            taken = conn.execute(
+                "SELECT 1 FROM expenses WHERE fingerprint = ? AND duplicate = 0 AND id != ?", (fingerprint, expense_id)
+            ).fetchone()
+            conn.execute("UPDATE expenses SET fingerprint = ?, duplicate = ? WHERE id = ?", (fingerprint, int(bool(taken)), expense_id))
+
+
+def _existing_fingerprints(conn, fingerprints) -> set:
+    """
+    return the fingerprints that belong to stored expenses
+    """
+    found = set()
+    for chunk in _chunked(fingerprints, FINGERPRINT_LOOKUP_SIZE):
+        sql = f"SELECT fingerprint FROM expenses WHERE duplicate = 0 AND fingerprint IN ({', '.join(['?'] * len(chunk))})"
+        found.update(row[0] for row in conn.execute(sql, chunk))
+    return found
+
+
+def existing_fingerprints(fingerprints) -> set:
+    """
+    return the fingerprints that belong to stored expenses, see expense_fingerprint()
+    """
+    return _existing_fingerprints(get_connection(), fingerprints)
 
 
-def add_expense(expense) -> None:
+def _column_value(field, value):
+    """
+    convert a value from an expense dict to its stored form (amounts to cents)
+    """
+    if field == "amount" and value is not None:
+        return to_cents(value)
+    return value
+
+
+def add_expense(expense, allow_duplicate=False) -> Expense:
     """
     add an expense entry to the database
+    raise DuplicateExpenseError if it has the fingerprint of a stored expense,
+    unless allow_duplicate, then it is stored as a duplicate
+    return the added expense with its new ID
     """
     with get_connection() as conn:
         cursor = conn.cursor()
         fields = [f for f in Expense.fields if f != "id"]
-        expense = Expense.from_dict(expense) if isinstance(expense, dict) else expense
-        values = [getattr(expense, k) for k in fields]
-        sql = f"INSERT INTO expenses ({', '.join(fields)}) VALUES ({', '.join(['?'] * len(fields))})"
-        cursor.execute(sql, values)
+        values = _expense_values(expense, fields)
+        external_id, fingerprint = _row_fingerprint(expense, fields, values)
+        duplicate = cursor.execute("SELECT id FROM expenses WHERE fingerprint = ? AND duplicate = 0", (fingerprint,)).fetchone()
+        if duplicate and not allow_duplicate:
+            raise DuplicateExpenseError(duplicate[0])
+        columns = fields + INTERNAL_COLUMNS
+        sql = f"INSERT INTO expenses ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})"
+        cursor.execute(sql, values + [external_id, fingerprint, int(bool(duplicate))])
         conn.commit()
+        expense_id = cursor.lastrowid
+    _cache.invalidate(_DERIVED_NAMESPACES)
+    return Expense.from_row([expense_id, *values])
+
+
+def add_expenses(expenses, chunk_size=BATCH_CHUNK_SIZE, allow_duplicates=False) -> BatchResult:
+    """
+    expenses: iterable of Expense objects or dicts
+    add many expense entries in a single transaction, rows are streamed to
+    executemany() in chunks of chunk_size
+    invalid rows and rows violating a constraint are skipped and reported in
+    BatchResult.rejected, other database errors are raised; rows with the
+    fingerprint of a stored expense or an earlier row in BatchResult.duplicates,
+    unless allow_duplicates, then they are stored as duplicates
+    """
+    fields = [f for f in Expense.fields if f != "id"]
+    columns = fields + INTERNAL_COLUMNS
+    sql = f"INSERT INTO expenses ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})"
+    result = BatchResult()
+    
+    with get_connection() as conn:
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        
+        for chunk in _chunked(enumerate(expenses), chunk_size):
+            
+            # validate rows before they reach the database
+            rows = []
+            for index, item in chunk:
+                try:
+                    values = _expense_values(item, fields)
+                    rows.append((index, item, values + list(_row_fingerprint(item, fields, values)) + [0]))
+                except (ValueError, TypeError, AttributeError, SchemaError) as e:
+                    result.rejected.append((index, item, str(e)))
+            
+            # look the fingerprints up before inserting, the rows of earlier
+            # chunks are already in the table, so they are found as well
+            taken = _existing_fingerprints(conn, [values[-2] for _, _, values in rows])
+            unique_rows = []
+            for index, item, values in rows:
+                if values[-2] in taken:
+                    if not allow_duplicates:
+                        result.duplicates.append((index, item))
+                        continue
+                    values[-1] = 1
+                else:
+                    taken.add(values[-2])
+                unique_rows.append((index, item, values))
+            rows = unique_rows
+            
+            # insert the whole chunk, if a row violates a constraint only that
+            # row is undone, so count the rows inserted before it, reject it
+            # and continue after it (a SAVEPOINT per chunk would make FTS5
+            # flush its pending index data every time, which gets slower
+            # the larger the index is); other errors, e.g. a locked or full
+            # database, may have rolled back the transaction and are raised
+            position = 0
+            while position < len(rows):
+                last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM expenses").fetchone()[0]
+                try:
+                    conn.executemany(sql, [values for _, _, values in rows[position:]])
+                    result.inserted += len(rows) - position
+                    break
+                except sqlite3.IntegrityError as e:
+                    done = conn.execute("SELECT COUNT(*) FROM expenses WHERE id > ?", (last_id,)).fetchone()[0]
+                    index, item, _ = rows[position + done]
+                    result.inserted += done
+                    result.rejected.append((index, item, str(e)))
+                    position += done + 1
+    
+    _cache.invalidate(_DERIVED_NAMESPACES)
+    result.rejected.sort(key=lambda rejected: rejected[0])
+    result.duplicates.sort(key=lambda duplicate: duplicate[0])
+    return result
 
 
-def edit_expense(expense_id, expense_data) -> None:
+def edit_expense(expense_id, expense_data) -> Expense | None:
     """
     expense_id: int, expense_data: dict
-    edit an existing expense entry in the database
+    edit an existing expense entry in the database, the external ID is kept
+    unless expense_data has one
+    return the edited expense, None if there is no expense with this ID
     """
+    _check_fields(expense_data)
     with get_connection() as conn:
         cursor = conn.cursor()
         fields = [f for f in Expense.fields if f != "id"]
-        values = [expense_data.get(k, None) for k in fields]
+        if "external_id" in expense_data:
+            fields.append("external_id")
+        values = [_column_value(k, expense_data.get(k, None)) for k in fields]
         set_clause = ", ".join([f"{field} = ?" for field in fields])
         sql = f"UPDATE expenses SET {set_clause} WHERE id = ?"
         cursor.execute(sql, values + [expense_id])
+        edited = cursor.rowcount > 0
+        if edited:
+            _refresh_fingerprints(conn, [expense_id])
         conn.commit()
+    _cache.invalidate(_DERIVED_NAMESPACES, [("expense", expense_id)])
+    return get_expense_by_id(expense_id) if edited else None
+
+
+def edit_expenses(changes, chunk_size=BATCH_CHUNK_SIZE) -> int:
+    """
+    changes: iterable of (expense_id, expense_data) with expense_data a dict
+    edit many expense entries in a single transaction, only the fields
+    present in each expense_data are updated (e.g. {"category": "food"})
+    return the number of updated rows
+    """
+    updated = 0
+    edited_ids = []
+    with get_connection() as conn:
+        for chunk in _chunked(changes, chunk_size):
+            
+            # group the changes by the set of fields they update,
+            # so every group can go through a single executemany()
+            groups = {}
+            fingerprinted_ids = []
+            for expense_id, expense_data in chunk:
+                _check_fields(expense_data)
+                edited_ids.append(expense_id)
+                fields = tuple(f for f in Expense.fields + ["external_id"] if f != "id" and f in expense_data)
+                if fields:
+                    values = [_column_value(k, expense_data[k]) for k in fields] + [expense_id]
+                    groups.setdefault(fields, []).append(values)
+                if any(f in expense_data for f in FINGERPRINT_FIELDS + ("external_id",)):
+                    fingerprinted_ids.append(expense_id)
+            
+            for fields, rows in groups.items():
+                set_clause = ", ".join([f"{field} = ?" for field in fields])
+                sql = f"UPDATE expenses SET {set_clause} WHERE id = ?"
+                updated += conn.executemany(sql, rows).rowcount
+            _refresh_fingerprints(conn, fingerprinted_ids)
+    
+    _cache.invalidate(_DERIVED_NAMESPACES, [("expense", expense_id) for expense_id in edited_ids])
+    return updated
     
 
-def delete_expense(expense_id) -> None:
+def delete_expense(expense_id) -> bool:
     """
     delete an expense entry from the database by its ID
+    return whether an expense was deleted
     """
     with get_connection() as conn:
         cursor = conn.cursor()
         sql = "DELETE FROM expenses WHERE id = ?"
         cursor.execute(sql, (expense_id,))
         conn.commit()
+        deleted = cursor.rowcount > 0
+    _cache.invalidate(_DERIVED_NAMESPACES, [("expense", expense_id)])
+    return deleted
+
+
+def delete_expenses(expense_ids, chunk_size=BATCH_CHUNK_SIZE) -> int:
+    """
+    delete many expense entries by their IDs in a single transaction
+    return the number of deleted rows
+    """
+    deleted = 0
+    deleted_ids = []
+    with get_connection() as conn:
+        sql = "DELETE FROM expenses WHERE id = ?"
+        for chunk in _chunked(expense_ids, chunk_size):
+            deleted_ids.extend(chunk)
+            deleted += conn.executemany(sql, [(expense_id,) for expense_id in chunk]).rowcount
+    
+    _cache.invalidate(_DERIVED_NAMESPACES, [("expense", expense_id) for expense_id in deleted_ids])
+    return deleted
       
 
+def find_duplicates() -> list:
+    """
+    scan for expenses that duplicate another one (duplicates from before
+    fingerprints, allowed duplicates and edits)
+    return lists of expenses, the original first, ordered by the original's ID
+    """
+    groups = {}
+    rows = get_connection().execute("""
+        SELECT original.id, copy.id FROM expenses AS copy
+        JOIN expenses AS original ON original.fingerprint = copy.fingerprint AND original.duplicate = 0
+        WHERE copy.duplicate = 1
+        ORDER BY copy.id
+    """).fetchall()
+    for original_id, expense_id in rows:
+        groups.setdefault(original_id, []).append(expense_id)
+    return [[get_expense_by_id(expense_id) for expense_id in [original_id, *duplicate_ids]] for original_id, duplicate_ids in sorted(groups.items())]
+
+
 def get_column_names() -> list:
     """
     retrieve the column names of the expenses table
     """
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA table_info(expenses)")
-        columns = [info[1] for info in cursor.fetchall()]
-        columns = columns[1:]
-        columns = [entry.capitalize() for entry in columns]
-        return columns
+    def load():
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA table_info(expenses)")
+            columns = [info[1] for info in cursor.fetchall() if info[1] not in INTERNAL_COLUMNS]
+            columns = columns[1:]
+            columns = [entry.capitalize() for entry in columns]
+            return columns
+    
+    return list(_cached(("columns",), load))
 
 
 def get_categories() -> list:
     """
-    retrieve the unique categories from the expenses table
+    retrieve the categories, most used first (ties: most recently used first)
     """
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        sql = "SELECT DISTINCT category FROM expenses"
-        cursor.execute(sql)
-        categories = [row[0] for row in cursor.fetchall()]
-        return categories
\ No newline at end of file
+    def load():
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            sql = "SELECT name FROM categories ORDER BY usage_count DESC, last_used DESC, name"
+            cursor.execute(sql)
+            categories = [row[0] for row in cursor.fetchall()]
+            return categories
+    
+    return list(_cached(("categories",), load))
+
+
+def _is_subsequence(text, name) -> bool:
+    """
+    return whether the characters of text appear in name in order, e.g. "grcy" in "grocery"
+    """
+    characters = iter(name)
+    return all(character in characters for character in text)
+
+
+def match_categories(text, limit=None, categories=None) -> list:
+    """
+    return the categories matching text, case insensitive and most used first within
+    each group: categories starting with text, then containing it, then containing
+    its characters in order
+    categories: list from get_categories() to match against instead of loading it
+    """
+    text = text.strip().lower()
+    if categories is None:
+        categories = get_categories()
+    if not text:
+        return categories[:limit]
+    
+    prefix, substring, fuzzy = [], [], []
+    for category in categories:
+        name = category.lower()
+        if name.startswith(text):
+            prefix.append(category)
+        elif text in name:
+            substring.append(category)
+        elif _is_subsequence(text, name):
+            fuzzy.append(category)
+    return (prefix + substring + fuzzy)[:limit]
+
+
+def get_months() -> list:
+    """
+    retrieve the months ("yyyy-MM") that have expenses, newest first
+    """
+    def load():
+        with get_connection() as conn:
+            sql = "SELECT DISTINCT month FROM expense_totals ORDER BY month DESC"
+            return [row[0] for row in conn.execute(sql)]
+    
+    return list(_cached(("months",), load))
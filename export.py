@@ -0,0 +1,168 @@
+# export.py
+
+"""
+Exports the expenses table to CSV, JSON Lines or Parquet.
+
+Rows are streamed from db.iter_expenses() and written in chunks, so memory
+stays bounded by the chunk size however large the ledger is. The file is
+written next to the target under a temporary name and only moved into place
+once the export is complete, so a failed or cancelled export never leaves a
+half-written file behind.
+
+Amounts are exported in euros with two decimals, as strings in CSV and JSON
+Lines, so no precision is lost, and as decimal(18, 2) in Parquet. Parquet
+export needs the optional pyarrow package.
+"""
+
+
+
+# =========================
+# imports
+# =========================
+import csv
+import itertools
+import json
+import os
+
+import db
+
+
+
+# =========================
+# configuration
+# =========================
+
+# number of rows written per chunk, progress is reported after every chunk
+EXPORT_CHUNK_SIZE = 5000
+
+# file extension -> format
+FORMATS = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".parquet": "parquet",
+}
+
+# positions of the converted columns in the raw rows
+AMOUNT_INDEX = db.Expense.fields.index("amount")
+FIXED_INDEX = db.Expense.fields.index("fixed")
+
+
+
+# =========================
+# classes
+# =========================
+class ExportCancelled(Exception):
+    """
+    raised by export_expenses() when the export was cancelled
+    """
+
+
+
+# =========================
+# writers
+# =========================
+def _text_row(row) -> list:
+    """
+    return a raw expense row with the amount in euros, as a string
+    """
+    row = list(row)
+    row[AMOUNT_INDEX] = str(db.from_cents(row[AMOUNT_INDEX]))
+    return row
+
+
+def _write_csv(f, chunks) -> None:
+    """
+    write the chunks as CSV with a header row
+    """
+    writer = csv.writer(f)
+    writer.writerow(db.Expense.fields)
+    for chunk in chunks:
+        writer.writerows(_text_row(row) for row in chunk)
+
+
+def _write_jsonl(f, chunks) -> None:
+    """
+    write the chunks as one JSON object per line
+    """
+    fields = db.Expense.fields
+    encode = json.JSONEncoder(ensure_ascii=False).encode    # json.dumps() would build an encoder per row
+    for chunk in chunks:
+        f.writelines(encode(dict(zip(fields, _text_row(row)))) + "\n" for row in chunk)
+
+
+def _write_parquet(path, chunks) -> None:
+    """
+    write the chunks as row groups of a Parquet file
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow") from None
+
+    schema = pyarrow.schema([
+        ("id", pyarrow.int64()),
+        ("date", pyarrow.string()),
+        ("category", pyarrow.string()),
+        ("name", pyarrow.string()),
+        ("amount", pyarrow.decimal128(18, 2)),
+        ("fixed", pyarrow.bool_()),
+        ("comment", pyarrow.string()),
+    ])
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            columns = [list(column) for column in zip(*chunk)]
+            columns[AMOUNT_INDEX] = [db.from_cents(cents) for cents in columns[AMOUNT_INDEX]]
+            columns[FIXED_INDEX] = [bool(value) for value in columns[FIXED_INDEX]]
+            writer.write_batch(pyarrow.record_batch(columns, schema=schema))
+
+
+
+# =========================
+# export
+# =========================
+def export_expenses(path, format=None, chunk_size=EXPORT_CHUNK_SIZE, progress=None, cancelled=None, **filters) -> int:
+    """
+    write the expenses passing the filters to path, ordered by date
+    format: "csv", "jsonl" or "parquet", by default taken from the file extension
+    progress: called with (rows written, total rows) after every chunk
+    cancelled: called before every chunk, the export stops with ExportCancelled if it returns True
+    optional filters: start_date, end_date, category, fixed, min_amount, max_amount (see db._where_clause)
+    return the number of exported expenses
+    """
+    if format is None:
+        format = FORMATS.get(os.path.splitext(path)[1].lower())
+    if format not in FORMATS.values():
+        raise ValueError(f"unknown export format for {path}, use one of {', '.join(FORMATS)}")
+
+    total = db.count_expenses(**filters) if progress is not None else None
+    written = 0
+    rows = db.iter_expenses(order_by="date", arraysize=chunk_size, raw=True, **filters)
+
+    def chunks():
+        nonlocal written
+        while True:
+            if cancelled is not None and cancelled():
+                raise ExportCancelled()
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+            written += len(chunk)
+            if progress is not None:
+                progress(written, max(total, written))
+
+    temp_path = f"{path}.part"
+    try:
+        if format == "parquet":
+            _write_parquet(temp_path, chunks())
+        else:
+            with open(temp_path, "w", encoding="utf-8", newline="") as f:
+                (_write_csv if format == "csv" else _write_jsonl)(f, chunks())
+        os.replace(temp_path, path)
+    except BaseException:
+        rows.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return written
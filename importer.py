@@ -0,0 +1,462 @@
+# importer.py
+
+"""
+Imports bank statements into the expenses table.
+
+Supported formats:
+
+- CSV bank exports, the columns are mapped to expense fields with a CsvMapping
+- OFX (1.x SGML and 2.x XML), one expense per <STMTTRN>
+- CAMT.053 (ISO 20022 XML), one expense per <Ntry>
+
+Debits become expenses with a positive amount, credits (incoming money) are
+skipped and counted. Files with at least PARALLEL_MIN_RECORDS records are cut
+into chunks that are parsed and validated on a process pool; the valid rows
+are then written by db.add_expenses() in one transaction. Rows that cannot be
+parsed or that the database refuses are reported with their position in the
+file (line for CSV, transaction number otherwise). Rows that are already
+stored, e.g. from an overlapping statement, are counted as duplicates and not
+imported again (see db.expense_fingerprint()). With dry_run=True nothing is
+written, which gives a preview of what an import would do.
+
+The pool uses the "spawn" start method, forking a process that runs Qt
+threads is not safe. Spawned workers import this module and db.py, and also
+re-import the __main__ module: when the application runs from main.py every
+worker imports ui.py and PyQt5 as well, which is why main.py only starts the
+GUI under its __main__ guard.
+"""
+
+
+
+# =========================
+# imports
+# =========================
+import csv
+import datetime
+import html
+import io
+import multiprocessing
+import os
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+import db
+
+
+
+# =========================
+# configuration
+# =========================
+
+# files with fewer records are parsed in-process, starting the pool would take longer
+PARALLEL_MIN_RECORDS = 20000
+
+# number of records per chunk sent to a worker process
+IMPORT_CHUNK_SIZE = 5000
+
+# category of imported expenses that have none
+DEFAULT_CATEGORY = "imported"
+
+# file extension -> format, .xml files are read as CAMT.053
+FORMATS = {
+    ".csv": "csv",
+    ".ofx": "ofx",
+    ".qfx": "ofx",
+    ".xml": "camt",
+    ".camt": "camt",
+}
+
+
+
+# =========================
+# classes
+# =========================
+class CsvMapping:
+    """
+    how the columns of a CSV bank export map to expense fields
+    columns are header names, or 0-based indexes if the file has no header
+    date_format: strptime format of the date column
+    decimal: decimal mark of the amounts, "." or ","
+    debit_negative: debits are negative amounts and positive rows are credits,
+    if False every row is an expense
+    """
+
+    def __init__(self, date="date", amount="amount", name="name", category=None, comment=None, external_id=None,
+                 date_format="%Y-%m-%d", decimal=".", delimiter=",", has_header=True, debit_negative=True,
+                 default_category=DEFAULT_CATEGORY, encoding="utf-8-sig") -> None:
+        self.columns = {
+            "date": date,
+            "amount": amount,
+            "name": name,
+            "category": category,
+            "comment": comment,
+            "external_id": external_id,
+        }
+        self.date_format = date_format
+        self.decimal = decimal
+        self.delimiter = delimiter
+        self.has_header = has_header
+        self.debit_negative = debit_negative
+        self.default_category = default_category
+        self.encoding = encoding
+
+
+    def __repr__(self):
+        return f"CsvMapping({self.columns}, date_format={self.date_format!r}, decimal={self.decimal!r})"
+
+
+class ParsedChunk:
+    """
+    the outcome of parsing a chunk of records
+    """
+
+    def __init__(self) -> None:
+        self.expenses = []      # (position, expense dict)
+        self.errors = []        # (position, message)
+        self.skipped = 0        # credits
+
+
+class ImportResult(ParsedChunk):
+    """
+    the outcome of import_file()
+    expenses: the valid (position, expense dict) rows, written unless dry_run
+    errors: (position, message) of the rows that were not imported, in file order
+    duplicates: number of valid rows that are already stored or repeat an earlier row
+    """
+
+    def __init__(self, dry_run=False) -> None:
+        super().__init__()
+        self.dry_run = dry_run
+        self.inserted = 0
+        self.duplicates = 0
+
+
+    def __repr__(self):
+        return (f"ImportResult(valid={len(self.expenses)}, inserted={self.inserted}, errors={len(self.errors)}, "
+                f"skipped={self.skipped}, duplicates={self.duplicates}, dry_run={self.dry_run})")
+
+
+
+# =========================
+# field parsing
+# =========================
+def _is_currency(text) -> bool:
+    """
+    return True for an ISO 4217 code like "EUR" or a currency symbol like "€"
+    """
+    if len(text) == 1:
+        return unicodedata.category(text) == "Sc"
+    return len(text) == 3 and text.isascii() and text.isalpha() and text.isupper()
+
+
+def _parse_amount(text, decimal=".") -> Decimal:
+    """
+    parse a bank amount like "-1.234,56 EUR" with the given decimal mark,
+    the other of "." and "," may only separate groups of three digits
+    """
+    group = "." if decimal == "," else ","
+    pattern = (rf"(?P<sign>[+-]?)(?P<prefix>[A-Z]{{3}}|\W)?(?P<prefix_sign>[+-]?)"
+               rf"(?P<integer>\d{{1,3}}(?:{re.escape(group)}\d{{3}})+|\d+)(?:{re.escape(decimal)}(?P<fraction>\d+))?"
+               rf"(?P<suffix>[A-Z]{{3}}|\W)?")
+    match = re.fullmatch(pattern, re.sub(r"\s+", "", str(text)))
+    if (not match or (match["sign"] and match["prefix_sign"])
+            or (match["prefix"] and match["suffix"])
+            or not all(_is_currency(symbol) for symbol in (match["prefix"], match["suffix"]) if symbol)):
+        raise ValueError(f"invalid amount: {text!r}")
+    number = match["sign"] + match["prefix_sign"] + match["integer"].replace(group, "")
+    if match["fraction"]:
+        number += "." + match["fraction"]
+    return Decimal(number)
+
+
+def _expense(date, name, amount, category=DEFAULT_CATEGORY, comment="", external_id=None) -> dict:
+    """
+    return a validated expense dict for a debit, amount > 0
+    """
+    if not category:
+        category = DEFAULT_CATEGORY
+    db.to_cents(amount)     # raises ValueError for amounts the database cannot store
+    return {
+        "date": date,
+        "category": category,
+        "name": (name or "").strip(),
+        "amount": amount,
+        "fixed": 0,
+        "comment": (comment or "").strip(),
+        "external_id": external_id,
+    }
+
+
+def _add_debit(chunk, position, amount, make_expense) -> None:
+    """
+    add the expense of a debit to the chunk, count credits as skipped
+    amount: signed, negative for debits
+    """
+    if amount >= 0:
+        chunk.skipped += 1
+        return
+    chunk.expenses.append((position, make_expense(-amount)))
+
+
+
+# =========================
+# CSV
+# =========================
+def _csv_records(text, has_header):
+    """
+    split CSV text into (first line number, record text) chunks of IMPORT_CHUNK_SIZE
+    records, quoted fields may contain line breaks
+    return the header line and the chunks
+    """
+    lines = text.splitlines(keepends=True)
+    header = None
+    start = 0
+    if has_header and lines:
+        header, start = lines[0], 1
+
+    chunks = []
+    chunk, chunk_start, records, quotes = [], start + 1, 0, 0
+    for number, line in enumerate(lines[start:], start=start + 1):
+        chunk.append(line)
+        quotes += line.count('"')
+        if quotes % 2:
+            continue    # inside a quoted field that spans lines
+        quotes = 0
+        records += 1
+        if records == IMPORT_CHUNK_SIZE:
+            chunks.append((chunk_start, "".join(chunk)))
+            chunk, chunk_start, records = [], number + 1, 0
+    if chunk:
+        chunks.append((chunk_start, "".join(chunk)))
+    return header, chunks
+
+
+def _parse_csv_chunk(first_line, text, header, mapping) -> ParsedChunk:
+    """
+    parse the records of a CSV chunk, runs in a worker process
+    """
+    chunk = ParsedChunk()
+    names = next(csv.reader([header], delimiter=mapping.delimiter)) if header else []
+    indexes = {}
+    for field, column in mapping.columns.items():
+        if column is None:
+            continue
+        if isinstance(column, int):
+            indexes[field] = column
+        elif column in names:
+            indexes[field] = names.index(column)
+        else:
+            chunk.errors.append((f"line {first_line}", f"column {column!r} not found"))
+            return chunk
+
+    reader = csv.reader(io.StringIO(text), delimiter=mapping.delimiter)
+    line_num = 0
+    for row in reader:
+        position = f"line {first_line + line_num}"
+        line_num = reader.line_num
+        if not any(cell.strip() for cell in row):
+            continue
+        try:
+            values = {field: row[index].strip() for field, index in indexes.items()}
+            date = datetime.datetime.strptime(values["date"], mapping.date_format).date().isoformat()
+            amount = _parse_amount(values["amount"], mapping.decimal)
+            if not mapping.debit_negative:
+                amount = -abs(amount)
+
+            def make_expense(debit) -> dict:
+                return _expense(
+                    date, values.get("name"), debit,
+                    values.get("category") or mapping.default_category,
+                    values.get("comment"), values.get("external_id") or None
+                )
+
+            _add_debit(chunk, position, amount, make_expense)
+        except (ValueError, IndexError) as e:
+            chunk.errors.append((position, str(e) if isinstance(e, ValueError) else "missing column"))
+    return chunk
+
+
+
+# =========================
+# OFX and CAMT.053
+# =========================
+def _blocks(text, tag) -> list:
+    """
+    return the <tag>...</tag> blocks of an XML or SGML text, namespace prefixes removed
+    """
+    pattern = re.compile(rf"<(?:\w+:)?{tag}[\s>].*?</(?:\w+:)?{tag}>", re.DOTALL)
+    return [re.sub(r"<(/?)\w+:", r"<\1", block) for block in pattern.findall(text)]
+
+
+def _ofx_value(block, tag) -> str | None:
+    """
+    return the value of an OFX element, closed (2.x) or not (1.x), with entities like &amp; decoded
+    """
+    match = re.search(rf"<{tag}>([^<\r\n]*)", block)
+    return html.unescape(match.group(1)).strip() if match else None
+
+
+def _parse_ofx_chunk(first, blocks) -> ParsedChunk:
+    """
+    parse <STMTTRN> blocks, runs in a worker process
+    """
+    chunk = ParsedChunk()
+    for number, block in enumerate(blocks, start=first):
+        position = f"transaction {number}"
+        try:
+            posted = _ofx_value(block, "DTPOSTED") or ""
+            date = datetime.datetime.strptime(posted[:8], "%Y%m%d").date().isoformat()
+            # OFX allows "," as the decimal mark and has no group separators
+            amount_text = _ofx_value(block, "TRNAMT") or ""
+            amount = _parse_amount(amount_text, "." if "." in amount_text else ",")
+            name = _ofx_value(block, "NAME") or _ofx_value(block, "PAYEE")
+            memo = _ofx_value(block, "MEMO")
+            external_id = _ofx_value(block, "FITID")
+            _add_debit(chunk, position, amount, lambda debit: _expense(date, name or memo, debit, DEFAULT_CATEGORY, memo, external_id))
+        except ValueError as e:
+            chunk.errors.append((position, str(e)))
+    return chunk
+
+
+def _camt_text(entry, path) -> str | None:
+    """
+    return the text of the first element matching path in a CAMT entry
+    """
+    element = entry.find(path)
+    return element.text.strip() if element is not None and element.text else None
+
+
+def _parse_camt_chunk(first, blocks) -> ParsedChunk:
+    """
+    parse <Ntry> blocks, runs in a worker process
+    """
+    from xml.etree import ElementTree
+
+    chunk = ParsedChunk()
+    for number, block in enumerate(blocks, start=first):
+        position = f"transaction {number}"
+        try:
+            # the default namespace is declared on the document, not on the entry
+            entry = ElementTree.fromstring(re.sub(r'\sxmlns(:\w+)?="[^"]*"', "", block))
+            date = (_camt_text(entry, "BookgDt/Dt") or _camt_text(entry, "BookgDt/DtTm")
+                    or _camt_text(entry, "ValDt/Dt") or "")[:10]
+            datetime.date.fromisoformat(date)
+            amount = _parse_amount(_camt_text(entry, "Amt") or "")
+            if _camt_text(entry, "CdtDbtInd") == "DBIT":
+                amount = -amount
+            details = ".//NtryDtls/TxDtls"
+            name = (_camt_text(entry, f"{details}/RltdPties/Cdtr/Nm") or _camt_text(entry, f"{details}/RltdPties/Cdtr/Pty/Nm")
+                    or _camt_text(entry, "AddtlNtryInf"))
+            comment = _camt_text(entry, f"{details}/RmtInf/Ustrd")
+            external_id = _camt_text(entry, "AcctSvcrRef") or _camt_text(entry, f"{details}/Refs/AcctSvcrRef")
+            _add_debit(chunk, position, amount, lambda debit: _expense(date, name or comment, debit, DEFAULT_CATEGORY, comment, external_id))
+        except (ValueError, ElementTree.ParseError) as e:
+            chunk.errors.append((position, str(e)))
+    return chunk
+
+
+
+# =========================
+# import
+# =========================
+def _chunks(path, format, mapping) -> list:
+    """
+    return the (parse function, args) of every chunk of the file
+    """
+    encoding = mapping.encoding if format == "csv" else "utf-8"
+    with open(path, encoding=encoding, errors="replace") as f:
+        text = f.read()
+
+    if format == "csv":
+        header, records = _csv_records(text, mapping.has_header)
+        return [(_parse_csv_chunk, (first_line, records_text, header, mapping)) for first_line, records_text in records]
+
+    blocks = _blocks(text, "STMTTRN" if format == "ofx" else "Ntry")
+    parse = _parse_ofx_chunk if format == "ofx" else _parse_camt_chunk
+    return [(parse, (start + 1, blocks[start:start + IMPORT_CHUNK_SIZE])) for start in range(0, len(blocks), IMPORT_CHUNK_SIZE)]
+
+
+def detect_format(path) -> str | None:
+    """
+    return the import format of a file from its extension, None if it is unknown
+    """
+    return FORMATS.get(os.path.splitext(path)[1].lower())
+
+
+def parse_file(path, format=None, mapping=None, workers=None, dry_run=True) -> ImportResult:
+    """
+    parse and validate a bank statement without writing anything
+    format: "csv", "ofx" or "camt", by default taken from the file extension
+    mapping: CsvMapping of a CSV file, the default expects date, amount and name columns
+    workers: number of worker processes, by default one per CPU, 1 parses in-process
+    """
+    if format is None:
+        format = detect_format(path)
+    if format not in ("csv", "ofx", "camt"):
+        raise ValueError(f"unknown import format for {path}, use one of {', '.join(FORMATS)}")
+    mapping = mapping or CsvMapping()
+
+    chunks = _chunks(path, format, mapping)
+    workers = workers or os.cpu_count() or 1
+    if len(chunks) * IMPORT_CHUNK_SIZE < PARALLEL_MIN_RECORDS or workers == 1:
+        parsed = [parse(*args) for parse, args in chunks]
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [pool.submit(parse, *args) for parse, args in chunks]
+            parsed = [future.result() for future in futures]
+
+    result = ImportResult(dry_run)
+    for chunk in parsed:
+        result.expenses.extend(chunk.expenses)
+        result.errors.extend(chunk.errors)
+        result.skipped += chunk.skipped
+    if dry_run:
+        result.duplicates = _count_duplicates(result.expenses)
+    return result
+
+
+def _count_duplicates(expenses) -> int:
+    """
+    return the number of (position, expense dict) rows that are already stored or repeat an earlier row
+    """
+    fingerprints = [
+        db.expense_fingerprint(expense["date"], expense["name"], db.to_cents(expense["amount"]), expense["external_id"])
+        for _, expense in expenses
+    ]
+    stored = db.existing_fingerprints(set(fingerprints))
+    seen = set()
+    duplicates = 0
+    for fingerprint in fingerprints:
+        if fingerprint in stored or fingerprint in seen:
+            duplicates += 1
+        seen.add(fingerprint)
+    return duplicates
+
+
+def import_file(path, format=None, mapping=None, workers=None, dry_run=False) -> ImportResult:
+    """
+    parse a bank statement and add its debits as expenses in one transaction
+    dry_run: only parse and validate, see parse_file()
+    """
+    result = parse_file(path, format, mapping, workers, dry_run)
+    if dry_run:
+        return result
+    return write_result(result)
+
+
+def write_result(result) -> ImportResult:
+    """
+    add the valid rows of a parse_file() result with dry_run=False as expenses
+    in one transaction, rows the database refuses are added to its errors
+    """
+    if not result.expenses:
+        return result
+
+    batch = db.add_expenses(expense for _, expense in result.expenses)
+    result.inserted = batch.inserted
+    result.duplicates = len(batch.duplicates)
+    result.errors.extend((result.expenses[index][0], reason) for index, _, reason in batch.rejected)
+    return result
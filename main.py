@@ -4,45 +4,117 @@
 # =========================
 # imports
 # =========================
+import time
+STARTUP_TIME = time.perf_counter()
+
+import json
+import os
 import sys
 import db
 import ui
+import profiling
 from db import Expense
-from PyQt5.QtWidgets import QApplication
+from PyQt5.QtWidgets import QApplication, QShortcut
+from PyQt5.QtGui import QKeySequence
+from PyQt5.QtCore import QTimer
 
 
 
 # =========================
-# testing db.py
+# startup timing
 # =========================
-db.create_table()
-# test_expense1 = Expense(None, "2025-05-29", "general", "test", 123.45, 0, "")
-# test_expense2 = Expense(None, "2025-05-30", "food", "test2", 67.89, 1, "test comment")
-# test_expense3 = Expense(None, "2025-05-31", "transport", "test3", 45.67, 0, "another long comment, lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation ullamco laboris nisi ut aliquip ex ea commodo consequat. Duis aute irure dolor in reprehenderit in voluptate velit esse cillum dolore eu fugiat nulla pariatur. Excepteur sint occaecat cupidatat non proident, sunt in culpa qui officia deserunt mollit anim id est laborum.")
-# test_expense4 = Expense(None, "2025-06-01", "entertainment", "test4", 89.99, 0, "short comment")
-# test_expense5 = Expense(None, "2025-06-02", "utilities", "test5", 150.00, 1, "another comment")
-# test_expense6 = Expense(None, "2025-06-03", "health", "test6", 200.00, 0, "yet another comment")
-# test_expense7 = Expense(None, "2025-06-04", "education", "test7", 300.00, 1, "final comment")
-# test_expense8 = Expense(None, "2025-06-05", "miscellaneous", "test8", 50.00, 0, "misc comment")
-# test_expense9 = Expense(None, "2025-06-06", "travel", "test9", 400.00, 1, "travel comment")
-# test_expense10 = Expense(None, "2025-06-07", "clothing", "test10", 75.00, 0, "clothing comment")
+# run with --startup-report (or MYFINANCELOG_STARTUP_REPORT=1) to print the time
+# to first paint, or with --startup-report=<path> to also write it as JSON
+STARTUP_REPORT = os.environ.get("MYFINANCELOG_STARTUP_REPORT")
+for arg in sys.argv[1:]:
+    if arg == "--startup-report" or arg.startswith("--startup-report="):
+        STARTUP_REPORT = arg.partition("=")[2] or "1"
+startup_marks = {}
+
+
+def mark_startup(name) -> None:
+    """
+    record the time since process start for a startup phase
+    """
+    startup_marks.setdefault(name, (time.perf_counter() - STARTUP_TIME) * 1000)
+
+
+def report_startup() -> None:
+    """
+    print the startup phases once the window is painted and the first page is shown
+    """
+    if not STARTUP_REPORT or not {"first paint", "first page"} <= startup_marks.keys():
+        return
+    for name, ms in sorted(startup_marks.items(), key=lambda mark: mark[1]):
+        print(f"startup: {name:<12} {ms:8.1f} ms", file=sys.stderr)
+    if STARTUP_REPORT != "1":
+        with open(STARTUP_REPORT, "w") as f:
+            json.dump(startup_marks, f, indent=2)
+
+
+mark_startup("imports")
 
-# db.add_expense(test_expense1)
-# db.add_expense(test_expense2)
-# db.add_expense(test_expense3)
-# db.add_expense(test_expense4)
-# db.add_expense(test_expense5)
-# db.add_expense(test_expense6)
-# db.add_expense(test_expense7)
-# db.add_expense(test_expense8)
-# db.add_expense(test_expense9)
-# db.add_expense(test_expense10)
 
 
 # =========================
-# testing ui.py
+# profiling
 # =========================
-app = QApplication(sys.argv)
-window = ui.Window()
-window.show()
-sys.exit(app.exec_())
\ No newline at end of file
+# run with --profile (or MYFINANCELOG_PROFILE=1) to time the db.py functions and
+# the main ui.py paths, or with --profile=<path> to also write the stats as JSON
+PROFILE = os.environ.get("MYFINANCELOG_PROFILE")
+for arg in sys.argv[1:]:
+    if arg == "--profile" or arg.startswith("--profile="):
+        PROFILE = arg.partition("=")[2] or "1"
+
+
+
+# =========================
+# main
+# =========================
+def main() -> int:
+    """
+    start the application, return its exit code
+    the import worker processes import this module, so nothing may run at import time
+    """
+    if PROFILE:
+        profiling.install(None if PROFILE == "1" else PROFILE)
+
+    # testing db.py
+    db.create_table()
+    mark_startup("database")
+    # test_expense1 = Expense(None, "2025-05-29", "general", "test", 123.45, 0, "")
+    # test_expense2 = Expense(None, "2025-05-30", "food", "test2", 67.89, 1, "test comment")
+    # test_expense3 = Expense(None, "2025-05-31", "transport", "test3", 45.67, 0, "another long comment, lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation ullamco laboris nisi ut aliquip ex ea commodo consequat. Duis aute irure dolor in reprehenderit in voluptate velit esse cillum dolore eu fugiat nulla pariatur. Excepteur sint occaecat cupidatat non proident, sunt in culpa qui officia deserunt mollit anim id est laborum.")
+    # test_expense4 = Expense(None, "2025-06-01", "entertainment", "test4", 89.99, 0, "short comment")
+    # test_expense5 = Expense(None, "2025-06-02", "utilities", "test5", 150.00, 1, "another comment")
+    # test_expense6 = Expense(None, "2025-06-03", "health", "test6", 200.00, 0, "yet another comment")
+    # test_expense7 = Expense(None, "2025-06-04", "education", "test7", 300.00, 1, "final comment")
+    # test_expense8 = Expense(None, "2025-06-05", "miscellaneous", "test8", 50.00, 0, "misc comment")
+    # test_expense9 = Expense(None, "2025-06-06", "travel", "test9", 400.00, 1, "travel comment")
+    # test_expense10 = Expense(None, "2025-06-07", "clothing", "test10", 75.00, 0, "clothing comment")
+
+    # db.add_expense(test_expense1)
+    # db.add_expense(test_expense2)
+    # db.add_expense(test_expense3)
+    # db.add_expense(test_expense4)
+    # db.add_expense(test_expense5)
+    # db.add_expense(test_expense6)
+    # db.add_expense(test_expense7)
+    # db.add_expense(test_expense8)
+    # db.add_expense(test_expense9)
+    # db.add_expense(test_expense10)
+
+    # testing ui.py
+    app = QApplication(sys.argv)
+    window = ui.Window()
+    mark_startup("window")
+    if PROFILE:
+        QShortcut(QKeySequence("F12"), window, activated=lambda: profiling.show_debug_panel(window))
+    window.expenses_model.page_loaded.connect(lambda: (mark_startup("first page"), report_startup()))
+    window.show()
+    QTimer.singleShot(0, lambda: (mark_startup("first paint"), report_startup()))
+    return app.exec_()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
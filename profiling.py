@@ -0,0 +1,310 @@
+# profiling.py
+
+"""
+Optional instrumentation of the db.py functions and the main ui.py paths.
+
+Run main.py with --profile (or MYFINANCELOG_PROFILE=1) to record, per
+function, the number of calls, the p50/p95/max latency and the number of rows
+touched, and to print them when the application exits. With --profile=<path>
+(or MYFINANCELOG_PROFILE=<path>) the stats are also written to that file as
+JSON. While profiling, F12 opens a debug panel with the live stats.
+
+install() replaces the functions with timing wrappers. Nothing is wrapped
+unless it is called, so profiling costs nothing when it is disabled.
+
+Reads of the expenses table run on DbExecutor threads, so
+Window._populate_expenses_table only covers starting the first page read;
+the read itself shows up as db.query_expenses.
+"""
+
+
+
+# =========================
+# imports
+# =========================
+import atexit
+import functools
+import inspect
+import json
+import sys
+import threading
+import time
+from collections import deque
+
+import db
+
+
+
+# =========================
+# configuration
+# =========================
+
+# number of latest durations kept per function for the percentiles
+SAMPLE_SIZE = 10000
+
+# db.py functions that are not wrapped, they run per value or per query
+# and timing them would cost more than they do
+DB_EXCLUDED = {"to_cents", "from_cents", "parse_amount", "get_connection", "expense_fingerprint", "normalise_name"}
+
+# private db.py functions that are wrapped anyway
+DB_PRIVATE = {"_open_connection"}
+
+# db.py functions returning the number of changed rows, other int results are not rows
+DB_ROW_COUNTS = {"edit_expenses", "delete_expenses"}
+
+# ui.Window methods that are wrapped
+UI_METHODS = [
+    "_populate_expenses_table",
+    "refresh_table",
+    "create_monthly_content",
+    "refresh_monthly_content",
+    "_draw_monthly_chart",
+]
+
+
+
+# =========================
+# classes
+# =========================
+class FunctionStats:
+    """
+    calls, durations and rows touched of a single function
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+
+
+    def add(self, seconds, rows) -> None:
+        """
+        record one call
+        """
+
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.rows += rows
+        self.samples.append(seconds)
+
+
+    def summary(self) -> dict:
+        """
+        return the stats as a dict, durations in milliseconds
+        """
+
+        samples = sorted(self.samples)
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total * 1000 / self.count if self.count else 0.0,
+            "p50_ms": _percentile(samples, 50) * 1000,
+            "p95_ms": _percentile(samples, 95) * 1000,
+            "max_ms": self.max * 1000,
+            "rows": self.rows,
+        }
+
+
+
+# =========================
+# stats
+# =========================
+_stats = {}
+_lock = threading.Lock()
+_installed = False
+
+
+def _percentile(samples, percent) -> float:
+    """
+    return the nearest-rank percentile of sorted samples, 0.0 if there are none
+    """
+    if not samples:
+        return 0.0
+    rank = max(1, -(-len(samples) * percent // 100))
+    return samples[int(rank) - 1]
+
+
+def record(name, seconds, rows=0) -> None:
+    """
+    record one call of the named function, may be called from any thread
+    """
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = FunctionStats()
+        stats.add(seconds, rows)
+
+
+def get_stats() -> dict:
+    """
+    return the summaries of all recorded functions, slowest total first
+    """
+    with _lock:
+        summaries = {name: stats.summary() for name, stats in _stats.items()}
+    return dict(sorted(summaries.items(), key=lambda item: item[1]["total_ms"], reverse=True))
+
+
+def reset_stats() -> None:
+    """
+    forget all recorded calls
+    """
+    with _lock:
+        _stats.clear()
+
+
+def dump(path) -> None:
+    """
+    write the stats to a JSON file
+    """
+    with open(path, "w") as f:
+        json.dump(get_stats(), f, indent=2)
+
+
+def print_stats(file=sys.stderr) -> None:
+    """
+    print the stats as a table
+    """
+    print(f"{'function':<44} {'count':>8} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'total ms':>10} {'rows':>10}", file=file)
+    for name, stats in get_stats().items():
+        print(
+            f"{name:<44} {stats['count']:>8} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+            f"{stats['max_ms']:>9.2f} {stats['total_ms']:>10.1f} {stats['rows']:>10}",
+            file=file
+        )
+
+
+
+# =========================
+# instrumentation
+# =========================
+def _count_rows(result, row_count=False) -> int:
+    """
+    return the number of rows a db.py function returned or changed
+    row_count: whether an int result is a number of rows
+    """
+    if isinstance(result, bool):
+        return int(result)
+    if isinstance(result, int):
+        return result if row_count else 0
+    if isinstance(result, db.Expense):
+        return 1
+    if isinstance(result, db.ExpenseFrame):
+        return len(result)
+    if isinstance(result, db.BatchResult):
+        return result.inserted
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        return len(result[0])   # a page from query_expenses()
+    if isinstance(result, list):
+        return len(result)
+    return 0
+
+
+def _wrap(name, function, row_count=False):
+    """
+    return a wrapper that records the calls of function under name
+    generators are timed from the first to the last row
+    """
+    if inspect.isgeneratorfunction(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            rows = 0
+            try:
+                for row in function(*args, **kwargs):
+                    rows += 1
+                    yield row
+            finally:
+                record(name, time.perf_counter() - start, rows)
+    else:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            record(name, time.perf_counter() - start, _count_rows(result, row_count))
+            return result
+    return wrapper
+
+
+def _db_functions() -> list:
+    """
+    return the names of the db.py functions to wrap
+    """
+    names = []
+    for name, function in vars(db).items():
+        if not inspect.isfunction(function) or function.__module__ != db.__name__:
+            continue
+        if name in DB_EXCLUDED or (name.startswith("_") and name not in DB_PRIVATE):
+            continue
+        names.append(name)
+    return names
+
+
+def install(path=None) -> None:
+    """
+    wrap the db.py functions and the ui.Window methods, call before the window is created
+    path: JSON file the stats are written to at exit, None to only print them
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    # functions are looked up in the module at call time, so replacing them
+    # also covers the calls inside db.py
+    for name in _db_functions():
+        setattr(db, name, _wrap(f"db.{name}", getattr(db, name), name in DB_ROW_COUNTS))
+
+    import ui
+    for name in UI_METHODS:
+        setattr(ui.Window, name, _wrap(f"ui.Window.{name}", getattr(ui.Window, name)))
+
+    atexit.register(print_stats)
+    if path:
+        atexit.register(dump, path)
+
+
+def show_debug_panel(parent=None):
+    """
+    open a window with the live stats, refreshed every second
+    """
+    from PyQt5.QtWidgets import QDialog, QVBoxLayout, QTableWidget, QTableWidgetItem, QPushButton
+    from PyQt5.QtCore import Qt, QTimer
+
+    columns = ["count", "p50_ms", "p95_ms", "max_ms", "total_ms", "rows"]
+
+    panel = QDialog(parent)
+    panel.setWindowTitle("MyFinanceLog Profile")
+    panel.setAttribute(Qt.WA_DeleteOnClose)
+    panel.resize(900, 500)
+    layout = QVBoxLayout()
+    panel.setLayout(layout)
+
+    table = QTableWidget(0, len(columns) + 1)
+    table.setHorizontalHeaderLabels(["function"] + columns)
+    table.verticalHeader().hide()
+    layout.addWidget(table)
+    reset_btn = QPushButton("Reset")
+    layout.addWidget(reset_btn)
+
+    def refresh() -> None:
+        stats = get_stats()
+        table.setRowCount(len(stats))
+        for row, (name, summary) in enumerate(stats.items()):
+            table.setItem(row, 0, QTableWidgetItem(name))
+            for column, key in enumerate(columns, start=1):
+                value = summary[key]
+                item = QTableWidgetItem(f"{value:.2f}" if isinstance(value, float) else str(value))
+                item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                table.setItem(row, column, item)
+        table.resizeColumnsToContents()
+
+    reset_btn.clicked.connect(lambda _: (reset_stats(), refresh()))
+    timer = QTimer(panel)
+    timer.timeout.connect(refresh)
+    timer.start(1000)
+    refresh()
+    panel.show()
+    return panel
@@ -0,0 +1,231 @@
+# report.py
+
+"""
+Command-line reports on the expenses database, for scripts and cron jobs.
+
+    python report.py month [YYYY-MM]              # totals by category for a month
+    python report.py months [--from ..] [--to ..] # totals per month
+    python report.py categories [--from ..] [--to ..]
+    python report.py fixed [--from ..] [--to ..]  # fixed vs variable totals
+    python report.py list [--from ..] [--to ..] [--category ..] [--fixed | --variable] [--limit N]
+    python report.py duplicates                   # expenses stored more than once
+    python report.py rebuild-totals               # recompute the summary tables
+
+--from and --to take a month (YYYY-MM) or a day (YYYY-MM-DD), both inclusive.
+--json prints the rows as JSON instead of a table, --db selects the database
+file (default: MYFINANCELOG_DB or expensesDB.sqlite), which must exist.
+
+The reports are summed up by SQLite through db.py, mostly from the
+expense_totals summary table. This module must never import PyQt5 or
+matplotlib, so a report does not pay for the GUI startup.
+"""
+
+
+
+# =========================
+# imports
+# =========================
+import argparse
+import datetime
+import itertools
+import json
+import os
+import sqlite3
+import sys
+
+import db
+
+
+
+# =========================
+# helpers
+# =========================
+def _date_range(args) -> dict:
+    """
+    return the start_date and end_date filters for the --from and --to arguments
+    months cover the whole month
+    """
+    filters = {}
+    if args.start:
+        filters["start_date"] = db.month_range(args.start)[0] if len(args.start) == 7 else args.start
+    if args.end:
+        filters["end_date"] = db.month_range(args.end)[1] if len(args.end) == 7 else args.end
+    return filters
+
+
+def _totals(rows) -> list:
+    """
+    sum up aggregate_expenses() rows grouped by one column over all periods
+    return (value, total, count) tuples, largest total first
+    """
+    totals = {}
+    for _, value, total, count in rows:
+        old_total, old_count = totals.get(value, (0, 0))
+        totals[value] = (old_total + total, old_count + count)
+    return sorted(((value, total, count) for value, (total, count) in totals.items()), key=lambda row: -row[1])
+
+
+def _print_totals(title, label, rows, as_json) -> None:
+    """
+    print (label, total in cents, count) rows with their share of the grand total
+    """
+    grand_total = sum(total for _, total, _ in rows)
+    if as_json:
+        print(json.dumps(
+            [{label: value, "total": str(db.from_cents(total)), "count": count} for value, total, count in rows],
+            indent=2
+        ))
+        return
+
+    print(title)
+    print(f"{label.capitalize():<24} {'Amount (€)':>14} {'Share':>7} {'Count':>8}")
+    for value, total, count in rows:
+        share = total / grand_total * 100 if grand_total else 0.0
+        print(f"{str(value):<24} {db.from_cents(total):>14,.2f} {share:>6.1f}% {count:>8}")
+    print(f"{'Total':<24} {db.from_cents(grand_total):>14,.2f} {'':>7} {sum(count for _, _, count in rows):>8}")
+
+
+
+# =========================
+# commands
+# =========================
+def month_report(args) -> None:
+    """
+    totals by category for a single month
+    """
+    month = args.month or datetime.date.today().strftime("%Y-%m")
+    start_date, end_date = db.month_range(month)
+    rows = db.aggregate_expenses("month", ("category",), start_date=start_date, end_date=end_date)
+    _print_totals(f"Expenses in {month}", "category", _totals(rows), args.json)
+
+
+def months_report(args) -> None:
+    """
+    totals per month
+    """
+    rows = db.aggregate_expenses("month", (), **_date_range(args))
+    _print_totals("Expenses per month", "month", [(month, total, count) for month, total, count in rows], args.json)
+
+
+def categories_report(args) -> None:
+    """
+    totals by category over a date range
+    """
+    rows = db.aggregate_expenses("month", ("category",), **_date_range(args))
+    _print_totals("Expenses by category", "category", _totals(rows), args.json)
+
+
+def fixed_report(args) -> None:
+    """
+    fixed and variable totals over a date range
+    """
+    rows = db.aggregate_expenses("month", ("fixed",), **_date_range(args))
+    totals = [("fixed" if fixed else "variable", total, count) for fixed, total, count in _totals(rows)]
+    _print_totals("Fixed and variable expenses", "type", totals, args.json)
+
+
+def list_report(args) -> None:
+    """
+    list the expenses in a date range, oldest first, streamed from the database
+    """
+    filters = _date_range(args)
+    if args.category:
+        filters["category"] = args.category
+    if args.fixed is not None:
+        filters["fixed"] = args.fixed
+    expenses = itertools.islice(db.iter_expenses(order_by="date", **filters), args.limit)
+
+    if args.json:
+        print(json.dumps([{field: getattr(expense, field) for field in db.Expense.fields} for expense in expenses], default=str, indent=2))
+        return
+
+    print(f"{'Date':<10}  {'Category':<16} {'Name':<28} {'Amount (€)':>12}  {'Type':<8}  Comment")
+    for expense in expenses:
+        print(
+            f"{expense.date:<10}  {expense.category[:16]:<16} {(expense.name or '')[:28]:<28} "
+            f"{expense.amount:>12,.2f}  {'fixed' if expense.fixed else 'variable':<8}  {expense.comment or ''}"
+        )
+
+
+def duplicates_report(args) -> None:
+    """
+    list the groups of expenses that are the same transaction, the original first
+    """
+    groups = db.find_duplicates()
+    if args.json:
+        print(json.dumps(
+            [[{field: getattr(expense, field) for field in db.Expense.fields} for expense in group] for group in groups],
+            default=str, indent=2
+        ))
+        return
+
+    for group in groups:
+        original, *duplicates = group
+        print(f"{original.date}  {(original.name or '')[:28]:<28} {original.amount:>12,.2f}  id {original.id}, "
+              f"duplicates: {', '.join(str(expense.id) for expense in duplicates)}")
+    print(f"{len(groups)} expenses with {sum(len(group) - 1 for group in groups)} duplicates")
+
+
+def rebuild_totals(args) -> None:
+    """
+    recompute the summary tables and the fingerprints from the expenses table
+    """
+    db.rebuild_totals()
+    print("summary tables rebuilt")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Print reports on the MyFinanceLog expenses.")
+    parser.add_argument("--db", help="path of the database file")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    month = commands.add_parser("month", help="totals by category for a month")
+    month.add_argument("month", nargs="?", help="YYYY-MM, default: the current month")
+    month.set_defaults(run=month_report)
+
+    ranged = [
+        ("months", "totals per month", months_report),
+        ("categories", "totals by category", categories_report),
+        ("fixed", "fixed and variable totals", fixed_report),
+        ("list", "list the expenses", list_report),
+    ]
+    for name, description, run in ranged:
+        command = commands.add_parser(name, help=description)
+        command.add_argument("--from", dest="start", help="YYYY-MM or YYYY-MM-DD")
+        command.add_argument("--to", dest="end", help="YYYY-MM or YYYY-MM-DD")
+        command.set_defaults(run=run)
+        if name == "list":
+            command.add_argument("--category", help="only this category")
+            command.add_argument("--fixed", action="store_const", const=True, help="only fixed expenses")
+            command.add_argument("--variable", dest="fixed", action="store_const", const=False, help="only variable expenses")
+            command.add_argument("--limit", type=int, help="print at most this many expenses")
+
+    duplicates = commands.add_parser("duplicates", help="list the expenses stored more than once")
+    duplicates.set_defaults(run=duplicates_report)
+
+    rebuild = commands.add_parser("rebuild-totals", help="recompute the summary tables")
+    rebuild.set_defaults(run=rebuild_totals)
+
+    args = parser.parse_args(argv)
+    if args.db:
+        db.set_db_path(args.db)
+
+    # a mistyped path must not silently create an empty database
+    if not os.path.isfile(db.DB_PATH):
+        print(f"error: database file {db.DB_PATH} does not exist", file=sys.stderr)
+        return 1
+    try:
+        db.create_table()
+        args.run(args)
+    except (ValueError, db.SchemaError, sqlite3.Error) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # the reader went away, e.g. piped into head, silence the flush at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
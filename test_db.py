@@ -0,0 +1,98 @@
+# test_db.py
+
+"""
+Tests of the duplicate detection in db.py, run with python -m pytest.
+"""
+
+
+
+# =========================
+# imports
+# =========================
+from decimal import Decimal
+
+import pytest
+
+import db
+
+
+
+# =========================
+# fixtures
+# =========================
+EXPENSE = {"date": "2024-03-01", "category": "food", "name": "Corner Shop", "amount": Decimal("12.34"), "fixed": 0, "comment": ""}
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path):
+    """
+    run every test on a fresh database file
+    """
+    path = db.DB_PATH
+    db.set_db_path(str(tmp_path / "expenses.sqlite"))
+    db.create_table()
+    yield
+    db.set_db_path(path)
+
+
+
+# =========================
+# tests
+# =========================
+def test_duplicate_add_is_rejected():
+    original = db.add_expense(EXPENSE)
+    with pytest.raises(db.DuplicateExpenseError) as error:
+        db.add_expense({**EXPENSE, "name": "  corner   SHOP "})
+    assert error.value.duplicate_of == original.id
+
+
+def test_allowed_duplicate_is_found():
+    original = db.add_expense(EXPENSE)
+    copy = db.add_expense(EXPENSE, allow_duplicate=True)
+    assert [[expense.id for expense in group] for group in db.find_duplicates()] == [[original.id, copy.id]]
+
+
+def test_deleting_the_original_hands_the_fingerprint_over():
+    original = db.add_expense(EXPENSE)
+    copy = db.add_expense(EXPENSE, allow_duplicate=True)
+    db.delete_expense(original.id)
+
+    assert db.find_duplicates() == []
+    with pytest.raises(db.DuplicateExpenseError) as error:
+        db.add_expense(EXPENSE)
+    assert error.value.duplicate_of == copy.id
+
+
+def test_editing_the_original_hands_the_fingerprint_over():
+    original = db.add_expense(EXPENSE)
+    copy = db.add_expense(EXPENSE, allow_duplicate=True)
+    db.edit_expense(original.id, {**EXPENSE, "amount": Decimal("1.00")})
+
+    assert db.find_duplicates() == []
+    with pytest.raises(db.DuplicateExpenseError) as error:
+        db.add_expense(EXPENSE)
+    assert error.value.duplicate_of == copy.id
+
+    # editing it back makes it the duplicate of the new holder
+    db.edit_expenses([(original.id, {"amount": Decimal("12.34")})])
+    assert [[expense.id for expense in group] for group in db.find_duplicates()] == [[copy.id, original.id]]
+
+
+def test_bulk_load_skips_stored_and_repeated_rows():
+    db.add_expense(EXPENSE)
+    result = db.add_expenses([EXPENSE, {**EXPENSE, "external_id": "T1"}, {**EXPENSE, "external_id": "T1"}])
+    assert result.inserted == 1
+    assert [index for index, _ in result.duplicates] == [0, 2]
+
+
+def test_rebuild_keeps_the_oldest_as_original():
+    original = db.add_expense(EXPENSE)
+    copy = db.add_expense(EXPENSE, allow_duplicate=True)
+    db.rebuild_totals()
+    assert [[expense.id for expense in group] for group in db.find_duplicates()] == [[original.id, copy.id]]
+
+
+def test_bulk_load_rejects_amounts_out_of_range():
+    result = db.add_expenses([{**EXPENSE, "amount": Decimal("1e20")}, EXPENSE])
+    assert result.inserted == 1
+    assert [index for index, _, _ in result.rejected] == [0]
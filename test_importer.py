@@ -0,0 +1,79 @@
+# test_importer.py
+
+"""
+Tests of the amount parsing in importer.py, run with python -m pytest.
+"""
+
+
+
+# =========================
+# imports
+# =========================
+from decimal import Decimal
+
+import pytest
+
+import db
+import importer
+
+
+
+# =========================
+# fixtures
+# =========================
+OFX = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240301<TRNAMT>{amount}<FITID>T1<NAME>Corner Shop</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path):
+    """
+    run every test on a fresh database file
+    """
+    path = db.DB_PATH
+    db.set_db_path(str(tmp_path / "expenses.sqlite"))
+    db.create_table()
+    yield
+    db.set_db_path(path)
+
+
+@pytest.fixture
+def ofx_file(tmp_path):
+    """
+    return a function that writes a one-transaction OFX file with the given TRNAMT
+    """
+    def write(amount):
+        path = tmp_path / "statement.ofx"
+        path.write_text(OFX.format(amount=amount))
+        return str(path)
+    return write
+
+
+
+# =========================
+# tests
+# =========================
+@pytest.mark.parametrize("text, decimal, amount", [
+    ("-1.234,56 EUR", ",", Decimal("-1234.56")),
+    ("1,234.56", ".", Decimal("1234.56")),
+    ("€ -12.30", ".", Decimal("-12.30")),
+    ("USD 1 000", ".", Decimal("1000")),
+])
+def test_amounts_are_parsed(text, decimal, amount):
+    assert importer._parse_amount(text, decimal) == amount
+
+
+@pytest.mark.parametrize("text", ["-1e20", "-1,50", "1.2.3", "12*", "EUR 1 EUR", ""])
+def test_malformed_amounts_are_rejected(text):
+    with pytest.raises(ValueError):
+        importer._parse_amount(text)
+
+
+@pytest.mark.parametrize("amount", ["-1,50", "-1.50"])
+def test_ofx_amounts_use_either_decimal_mark(ofx_file, amount):
+    result = importer.parse_file(ofx_file(amount), workers=1)
+    assert result.errors == []
+    assert [expense["amount"] for _, expense in result.expenses] == [Decimal("1.50")]
@@ -3,13 +3,14 @@
 # =========================
 # imports
 # =========================
-from PyQt5.QtWidgets import QWidget, QGridLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QTableWidget, QTableWidgetItem, QMessageBox, QSizePolicy, QDialog, QVBoxLayout, QHBoxLayout, QLineEdit, QCheckBox, QTextEdit, QDateEdit, QStackedWidget, QComboBox
-from PyQt5.QtGui import QPixmap
-from PyQt5.QtCore import Qt, QDate
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
+from PyQt5.QtWidgets import QWidget, QGridLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QTableView, QAbstractItemView, QStyledItemDelegate, QStyle, QMessageBox, QSizePolicy, QDialog, QVBoxLayout, QHBoxLayout, QLineEdit, QCheckBox, QTextEdit, QDateEdit, QStackedWidget, QComboBox, QCompleter, QFileDialog, QProgressDialog
+from PyQt5.QtGui import QPixmap, QPainter, QColor, QPen, QFont
+from PyQt5.QtCore import Qt, QObject, QDate, QAbstractTableModel, QModelIndex, QEvent, QRect, QTimer, QStringListModel, pyqtSignal
 import datetime
+import threading
 import db
+import export
+from worker import DbExecutor
 
 
 # =========================
@@ -33,6 +34,15 @@ class Window(QWidget):
         self.setWindowTitle("MyFinanceLog")
         self.setGeometry(100, 100, 1450, 750)
         self.setStyleSheet("background-color: white;")
+        
+        
+        # database calls run in the background, results come back as signals
+        self.db_executor = DbExecutor(self)
+        self.db_executor.busy_changed.connect(self._set_loading)
+        self.db_executor.error.connect(self._show_db_error)
+        
+        # categories most used first, loaded in the background by _load_filter_categories()
+        self.categories = []
 
 
         # create the main layout
@@ -57,12 +67,13 @@ class Window(QWidget):
         
         
         # main content area
+        # the monthly overview is created the first time it is opened
         self.stacked_content = QStackedWidget()
         self.main_content = self.create_main_content()
-        self.monthly_content = self.create_monthly_content()
+        self.monthly_content = None
         self.stacked_content.addWidget(self.main_content)       # index 0
-        self.stacked_content.addWidget(self.monthly_content)    # index 1
         grid.addWidget(self.stacked_content, 1, 1, 1, 1)
+        self._load_filter_categories()
         
         
         grid.setColumnStretch(0, 0)  # side bar
@@ -72,7 +83,7 @@ class Window(QWidget):
         # connect buttons to switch between main and monthly content
         # and set the initial content to main
         self.main_btn.clicked.connect(lambda: (self.stacked_content.setCurrentIndex(0), self.stacked_side_bar.setCurrentIndex(0)))
-        self.monthly_btn.clicked.connect(lambda: (self.stacked_content.setCurrentIndex(1), self.stacked_side_bar.setCurrentIndex(1)))
+        self.monthly_btn.clicked.connect(self.show_monthly_content)
         self.main_btn.click()
         
         
@@ -143,6 +154,77 @@ class Window(QWidget):
         add_expense_btn.clicked.connect(lambda _: self.add_expense())
         side_layout.addWidget(add_expense_btn)
         
+        # button for exporting the filtered expenses to a file
+        export_btn = QPushButton("Export")
+        style_side_bar_btns(export_btn)
+        export_btn.clicked.connect(lambda _: self.export_expenses())
+        side_layout.addWidget(export_btn)
+        
+        # button for importing a bank statement
+        import_btn = QPushButton("Import")
+        style_side_bar_btns(import_btn)
+        import_btn.clicked.connect(lambda _: self.import_expenses())
+        side_layout.addWidget(import_btn)
+        
+        # filters for the expenses table, applied once the input pauses
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(300)
+        self.filter_timer.timeout.connect(self._apply_filters)
+        
+        filter_label = QLabel("Filters")
+        filter_label.setStyleSheet("font-size: 17px; font-weight: bold; color: white;")
+        side_layout.addWidget(filter_label)
+        
+        # date range, the minimum date shows as "Any" and means no limit
+        self.filter_from_input = QDateEdit()
+        self.filter_to_input = QDateEdit()
+        for label, date_input in (("From:", self.filter_from_input), ("To:", self.filter_to_input)):
+            date_label = QLabel(label)
+            date_label.setStyleSheet("font-size: 15px; color: white;")
+            date_input.setStyleSheet("background-color: white; font-size: 15px;")
+            date_input.setDisplayFormat("yyyy-MM-dd")
+            date_input.setCalendarPopup(True)
+            date_input.setMinimumDate(QDate(2000, 1, 1))
+            date_input.setSpecialValueText("Any")
+            date_input.setDate(date_input.minimumDate())
+            date_input.dateChanged.connect(self.filter_timer.start)
+            date_layout = QHBoxLayout()
+            date_layout.addWidget(date_label)
+            date_layout.addWidget(date_input, 1)
+            side_layout.addLayout(date_layout)
+        
+        # category, the list is loaded in the background
+        self.filter_category_input = QComboBox()
+        self.filter_category_input.setStyleSheet("background-color: white; font-size: 15px;")
+        self.filter_category_input.addItem("All categories")
+        self.filter_category_input.currentIndexChanged.connect(self.filter_timer.start)
+        side_layout.addWidget(self.filter_category_input)
+        
+        # fixed or variable expenses
+        self.filter_fixed_input = QComboBox()
+        self.filter_fixed_input.setStyleSheet("background-color: white; font-size: 15px;")
+        self.filter_fixed_input.addItems(["Fixed and variable", "Fixed", "Variable"])
+        self.filter_fixed_input.currentIndexChanged.connect(self.filter_timer.start)
+        side_layout.addWidget(self.filter_fixed_input)
+        
+        # amount range in euros, empty means no limit
+        amount_layout = QHBoxLayout()
+        self.filter_min_amount_input = QLineEdit()
+        self.filter_max_amount_input = QLineEdit()
+        for placeholder, amount_input in (("Min €", self.filter_min_amount_input), ("Max €", self.filter_max_amount_input)):
+            amount_input.setPlaceholderText(placeholder)
+            amount_input.setStyleSheet("background-color: white; font-size: 15px;")
+            amount_input.textChanged.connect(self.filter_timer.start)
+            amount_layout.addWidget(amount_input)
+        side_layout.addLayout(amount_layout)
+        
+        # button for clearing all filters
+        reset_filters_btn = QPushButton("Reset Filters")
+        style_side_bar_btns(reset_filters_btn)
+        reset_filters_btn.clicked.connect(lambda _: self._reset_filters())
+        side_layout.addWidget(reset_filters_btn)
+        side_layout.addStretch()
         
         return side_bar
     
@@ -162,11 +244,31 @@ class Window(QWidget):
         side_layout.setSpacing(20)
         side_bar.setLayout(side_layout)
         
-        # button for adding a new expense
-        add_expense_btn = QPushButton("placeholder")
-        style_side_bar_btns(add_expense_btn)
-        add_expense_btn.clicked.connect(lambda _: self.add_expense())
-        side_layout.addWidget(add_expense_btn)
+        # month range selector, months are listed newest first
+        current_month = datetime.date.today().strftime("%Y-%m")
+        self.month_from_input = QComboBox()
+        self.month_to_input = QComboBox()
+        for label, month_input in (("From:", self.month_from_input), ("To:", self.month_to_input)):
+            month_label = QLabel(label)
+            month_label.setStyleSheet("font-size: 17px; color: white;")
+            month_input.setStyleSheet("background-color: white; font-size: 15px;")
+            month_input.addItem(current_month)
+            month_input.currentTextChanged.connect(lambda _: self.refresh_monthly_content())
+            side_layout.addWidget(month_label)
+            side_layout.addWidget(month_input)
+        
+        # buttons for stepping both ends of the range by one month
+        step_layout = QHBoxLayout()
+        previous_btn = QPushButton("Previous")
+        next_btn = QPushButton("Next")
+        style_side_bar_btns(previous_btn)
+        style_side_bar_btns(next_btn)
+        previous_btn.clicked.connect(lambda _: self._step_months(1))
+        next_btn.clicked.connect(lambda _: self._step_months(-1))
+        step_layout.addWidget(previous_btn)
+        step_layout.addWidget(next_btn)
+        side_layout.addLayout(step_layout)
+        side_layout.addStretch()
         
         return side_bar
     
@@ -201,128 +303,210 @@ class Window(QWidget):
         # placeholder
         # placeholder_left = QLabel("spacing")
         # placeholder_right = QLabel("spacing")
-        placeholder_bottom = QLabel("spacing")
-        placeholder_bottom.setStyleSheet("color: transparent;")
         # main_layout.addWidget(placeholder_left, 1, 0, 1, 1)
         # main_layout.addWidget(placeholder_right, 1, 2, 1, 1)
-        main_layout.addWidget(placeholder_bottom, 2, 1, 1, 1)
         
-        # create table with expenses
-        self.expenses_table = QTableWidget()
+        # search box above the table, the search runs once typing pauses
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search name, comment or category...")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_input.setStyleSheet("padding: 6px; border: 1px solid #cccccc;")
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self._apply_search)
+        self.search_input.textChanged.connect(self.search_timer.start)
+        main_layout.addWidget(self.search_input, 1, 1, 1, 1)
+        
+        # loading indicator below the table, transparent while idle
+        self.status_label = QLabel("Loading...")
+        self.status_label.setAlignment(Qt.AlignCenter)
+        self._set_loading(False)
+        main_layout.addWidget(self.status_label, 3, 1, 1, 1)
+        
+        # create table with expenses, rows are loaded page by page
+        # in the background while the user scrolls
+        self.expenses_model = ExpensesTableModel(self.db_executor, self)
+        self.expenses_model.page_loaded.connect(self._resize_table_columns)
+        self.expenses_table = QTableView()
+        self.expenses_table.setModel(self.expenses_model)
+        self.expenses_table.setMouseTracking(True)     # for the hover effect of the buttons
+        
+        # clicking a header sorts by that column in the database, newest first by default
+        self.expenses_table.horizontalHeader().setSortIndicator(ExpensesTableModel.FIELDS.index("date"), Qt.DescendingOrder)
+        self.expenses_table.setSortingEnabled(True)
+        
+        # edit and delete buttons, painted by delegates instead of a widget per row
+        self.edit_delegate = ButtonDelegate("Edit", "#00CD00", "#00FF00", self.expenses_table)
+        self.edit_delegate.clicked.connect(lambda row: self.edit_expense(self.expenses_model.expense_at(row).id))
+        self.expenses_table.setItemDelegateForColumn(ExpensesTableModel.EDIT_COL_INDEX, self.edit_delegate)
+        self.delete_delegate = ButtonDelegate("Delete", "#CD0000", "#FF0000", self.expenses_table)
+        self.delete_delegate.clicked.connect(lambda row: self.delete_expense(self.expenses_model.expense_at(row).id))
+        self.expenses_table.setItemDelegateForColumn(ExpensesTableModel.DELETE_COL_INDEX, self.delete_delegate)
         
-        # format and column names
-        self.expenses_table.setEditTriggers(QTableWidget.NoEditTriggers)  # make table read-only
-        self.expenses_table.setColumnCount(len(db.Expense.fields) + 1)
-        column_names = db.get_column_names()
-        self.expenses_table.setHorizontalHeaderLabels(column_names + ["Edit", "Delete"])
+        # format
+        self.expenses_table.setEditTriggers(QAbstractItemView.NoEditTriggers)  # make table read-only
+        self.expenses_table.verticalHeader().setDefaultSectionSize(36)
+        self.expenses_table.verticalHeader().hide()     # row numbers change while pages are loaded
         self.expenses_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #f0f0f0;
                 border: 1px solid #cccccc;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 8px;
             }
         """)
         
         self._populate_expenses_table()
-        self.expenses_table.scrollToBottom()
         
         # add table to main layout
-        main_layout.addWidget(self.expenses_table, 1, 1, 1, 1)
+        main_layout.addWidget(self.expenses_table, 2, 1, 1, 1)
         
         return main_content
     
     
     def _populate_expenses_table(self) -> None:
         """
-        populate the expenses table with data from the database
+        reload the expenses table from the database, starting with the first page
         """
         
-        # get expenses from the database
-        # and set the number of rows in the table
-        expenses = db.get_expenses()
-        self.expenses_table.setRowCount(len(expenses))
+        self._columns_resized = False
+        self.expenses_model.reset()
+        self.expenses_model.fetchMore(QModelIndex())
+    
+    
+    def _apply_search(self) -> None:
+        """
+        show the expenses matching the search box, or all expenses if it is empty
+        """
         
-        # set column for edit and delete buttons
-        EDIT_COL_INDEX = len(db.Expense.fields) - 1
-        DELETE_COL_INDEX = len(db.Expense.fields)
-        
-        # populate the table with expense data
-        for row, expense in enumerate(expenses):
-            for col, field in enumerate(db.Expense.fields[1:]):
-                
-                # get value from expense object
-                value = getattr(expense, field)
-                
-                # format value based on field type
-                if field == "date":
-                    item = QTableWidgetItem(str(value))
-                    item.setTextAlignment(Qt.AlignCenter)
-                elif field == "amount":
-                    item = QTableWidgetItem(f"{value:.2f}€")
-                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-                elif field == "fixed":
-                    item = QTableWidgetItem("Fixed" if value == 1 else "Variable")
-                    item.setTextAlignment(Qt.AlignCenter)
-                elif field == "comment":
-                    # truncate long comments and add a tooltip with full text
-                    if len(value) > 50:
-                        item = QTableWidgetItem(value[:40] + "...")
-                        item.setToolTip(value)
-                    else:
-                        item = QTableWidgetItem(value)
-                else:
-                    item = QTableWidgetItem(str(value))
-                    item.setTextAlignment(Qt.AlignLeft | Qt.AlignVCenter)
-                
-                # set item flags to prevent editing
-                self.expenses_table.setItem(row, col, item)
-            
-            
-            # create edit button
-            edit_btn = QPushButton("Edit")
-            edit_btn.clicked.connect(lambda _, expense_id=expense.id: self.edit_expense(expense_id))
-            style_edit_btns(edit_btn)
-            
-            # create a widget to center the edit button
-            edit_widget = QWidget()
-            edit_layout = QHBoxLayout(edit_widget)
-            edit_layout.addWidget(edit_btn)
-            edit_layout.setContentsMargins(0, 0, 0, 0)
-            edit_layout.setAlignment(Qt.AlignCenter)
-
-            # add the edit button
-            self.expenses_table.setCellWidget(row, EDIT_COL_INDEX, edit_btn)
-            
-            
-            # create delete button
-            delete_btn = QPushButton("Delete")
-            delete_btn.clicked.connect(lambda _, expense_id=expense.id: self.delete_expense(expense_id))
-            style_delete_btns(delete_btn)
-            
-            # create a widget to center the delete button
-            delete_widget = QWidget()
-            delete_layout = QHBoxLayout(delete_widget)
-            delete_layout.addWidget(delete_btn)
-            delete_layout.setContentsMargins(0, 0, 0, 0)
-            delete_layout.setAlignment(Qt.AlignCenter)
-
-            # add the delete button
-            self.expenses_table.setCellWidget(row, DELETE_COL_INDEX, delete_btn)
+        search = self.search_input.text().strip()
+        model = self.expenses_model
+        if search == model.search:
+            return
+        
+        # a new search is ranked by relevance until a header is clicked,
+        # without a search the table goes back to newest first
+        header = self.expenses_table.horizontalHeader()
+        if search and not model.search:
+            model.order_by = None
+            header.setSortIndicator(-1, Qt.DescendingOrder)
+        elif not search and model.order_by is None:
+            model.order_by, model.descending = "date", True
+            header.setSortIndicator(ExpensesTableModel.FIELDS.index("date"), Qt.DescendingOrder)
+        model.search = search
+        self._populate_expenses_table()
+    
+    
+    def _apply_filters(self) -> None:
+        """
+        show the expenses passing the filters in the side bar
+        amounts that cannot be parsed are marked and ignored
+        """
         
+        filters = {}
+        for key, date_input in (("start_date", self.filter_from_input), ("end_date", self.filter_to_input)):
+            if date_input.date() != date_input.minimumDate():
+                filters[key] = date_input.date().toString("yyyy-MM-dd")
+        if self.filter_category_input.currentIndex() > 0:
+            filters["category"] = self.filter_category_input.currentText()
+        if self.filter_fixed_input.currentIndex() > 0:
+            filters["fixed"] = self.filter_fixed_input.currentIndex() == 1
+        for key, amount_input in (("min_amount", self.filter_min_amount_input), ("max_amount", self.filter_max_amount_input)):
+            text = amount_input.text().strip()
+            valid = True
+            if text:
+                try:
+                    filters[key] = db.parse_amount(text)
+                except ValueError:
+                    valid = False
+            amount_input.setStyleSheet(f"background-color: {'white' if valid else '#FFCCCC'}; font-size: 15px;")
+        
+        if filters != self.expenses_model.filters:
+            self.expenses_model.filters = filters
+            self._populate_expenses_table()
+    
+    
+    def _reset_filters(self) -> None:
+        """
+        clear all filters, the table is reloaded once
+        """
+        
+        for date_input in (self.filter_from_input, self.filter_to_input):
+            date_input.setDate(date_input.minimumDate())
+        self.filter_category_input.setCurrentIndex(0)
+        self.filter_fixed_input.setCurrentIndex(0)
+        self.filter_min_amount_input.clear()
+        self.filter_max_amount_input.clear()
+        self.filter_timer.stop()
+        self._apply_filters()
+    
+    
+    def _load_filter_categories(self) -> None:
+        """
+        load the categories of the category filter in the background
+        """
+        
+        self.db_executor.read(db.get_categories, key="filter_categories", on_result=self._set_filter_categories)
+    
+    
+    def _set_filter_categories(self, categories) -> None:
+        """
+        fill the category filter, keeping the selected category
+        """
+        
+        self.categories = categories
+        category_input = self.filter_category_input
+        selected = category_input.currentText() if category_input.currentIndex() > 0 else None
+        category_input.blockSignals(True)
+        category_input.clear()
+        category_input.addItem("All categories")
+        category_input.addItems(categories)
+        if selected is not None:
+            if selected not in categories:
+                category_input.addItem(selected)
+            category_input.setCurrentText(selected)
+        category_input.blockSignals(False)
+    
+    
+    def _resize_table_columns(self) -> None:
+        """
+        fit the columns to the content once the first page has been loaded
+        """
+        
+        if self._columns_resized:
+            return
+        self._columns_resized = True
+        
+        # set column for edit and delete buttons
+        EDIT_COL_INDEX = self.expenses_model.EDIT_COL_INDEX
+        DELETE_COL_INDEX = self.expenses_model.DELETE_COL_INDEX
         
         # resize columns to fit content
         self.expenses_table.resizeColumnsToContents()
         self.expenses_table.setColumnWidth(EDIT_COL_INDEX, 80)
         self.expenses_table.setColumnWidth(DELETE_COL_INDEX, 80)
-        total_width = sum(self.expenses_table.columnWidth(i) for i in range(self.expenses_table.columnCount()))
+        total_width = sum(self.expenses_table.columnWidth(i) for i in range(self.expenses_model.columnCount()))
         TABLE_PADDING = 30
         # self.expenses_table.setMinimumWidth(total_width + TABLE_PADDING)
         self.expenses_table.setMaximumWidth(total_width + TABLE_PADDING)
         # self.expenses_table.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Expanding)
 
     
+    def show_monthly_content(self) -> None:
+        """
+        switch to the monthly overview, creating it on first use
+        """
+        
+        if self.monthly_content is None:
+            self.monthly_content = self.create_monthly_content()
+            self.stacked_content.addWidget(self.monthly_content)    # index 1
+        self.stacked_content.setCurrentIndex(1)
+        self.stacked_side_bar.setCurrentIndex(1)
+        self.refresh_monthly_content()
+    
+    
     def create_monthly_content(self) -> QWidget:    # the current version is just a placeholder, generated by Copilot
                                                     # method is not yet implemented
         """
@@ -337,17 +521,114 @@ class Window(QWidget):
         monthly_layout.setSpacing(10)
         monthly_content.setLayout(monthly_layout)
 
-        # get expenses and calculate totals by category for selected month
-        expenses = db.get_expenses()
-        current_month = datetime.date.today().strftime("%Y-%m")
+        # matplotlib is only imported once the monthly overview is opened
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
+        
+        # create the figure and canvas for the pie chart once, later
+        # redraws only replace the wedges of the axes
+        self.monthly_figure = Figure(figsize=(5, 5))
+        self.monthly_axes = self.monthly_figure.add_subplot(111)
+        self.monthly_canvas = FigureCanvas(self.monthly_figure)
+        monthly_layout.addWidget(self.monthly_canvas, 0, 0, 1, 1)
+        
+        # category totals by (from month, to month, data version) and the key of the drawn chart
+        self._monthly_totals_cache = {}
+        self._monthly_chart_key = None
+        self._months_version = None
+
+        return monthly_content
+    
+    
+    def refresh_monthly_content(self) -> None:
+        """
+        redraw the pie chart for the selected month range if it is not drawn yet
+        or the expenses changed, totals already seen are taken from the cache
+        """
+        
+        if self.monthly_content is None:
+            return
+        
+        data_version = db.get_data_version()
+        if self._months_version != data_version:
+            self._months_version = data_version
+            self.db_executor.read(db.get_months, key="months", on_result=self._set_months)
+        
+        # totals for another data version are outdated
+        start_month, end_month = sorted((self.month_from_input.currentText(), self.month_to_input.currentText()))
+        key = (start_month, end_month, data_version)
+        if key == self._monthly_chart_key:
+            return
+        self._monthly_totals_cache = {k: v for k, v in self._monthly_totals_cache.items() if k[2] == data_version}
+        if key in self._monthly_totals_cache:
+            self.db_executor.cancel("monthly_totals")
+            self._draw_monthly_chart(key, self._monthly_totals_cache[key])
+            return
+        
+        # get totals by category for the selected months, summed up by the database
+        start_date, end_date = db.month_range(start_month, end_month)
+        self.db_executor.read(
+            db.aggregate_expenses, "month", ("category",),
+            start_date = start_date,
+            end_date = end_date,
+            key = "monthly_totals",
+            on_result = lambda rows: self._add_monthly_totals(key, rows)
+        )
+    
+    
+    def _add_monthly_totals(self, key, rows) -> None:
+        """
+        sum up the loaded monthly totals by category, cache and draw them
+        """
+        
         category_totals = {}
-        for expense in expenses:
-            if str(expense.date).startswith(current_month):
-                category_totals[expense.category] = category_totals.get(expense.category, 0) + expense.amount
+        for _, category, total, _ in rows:
+            category_totals[category] = category_totals.get(category, 0) + db.from_cents(total)
+        self._monthly_totals_cache[key] = category_totals
+        self._draw_monthly_chart(key, category_totals)
+    
+    
+    def _set_months(self, months) -> None:
+        """
+        fill the month selectors, keeping the selected months
+        """
+        
+        months = sorted(set(months) | {datetime.date.today().strftime("%Y-%m")}, reverse=True)
+        for month_input in (self.month_from_input, self.month_to_input):
+            selected = month_input.currentText()
+            month_input.blockSignals(True)
+            month_input.clear()
+            month_input.addItems(months)
+            month_input.setCurrentText(selected)
+            month_input.blockSignals(False)
+    
+    
+    def _step_months(self, step) -> None:
+        """
+        move the selected month range by step entries of the month lists
+        (the lists are sorted newest first, so 1 steps back in time)
+        """
+        
+        for month_input in (self.month_from_input, self.month_to_input):
+            index = min(max(month_input.currentIndex() + step, 0), month_input.count() - 1)
+            month_input.blockSignals(True)
+            month_input.setCurrentIndex(index)
+            month_input.blockSignals(False)
+        self.refresh_monthly_content()
+    
+    
+    def _draw_monthly_chart(self, key, category_totals) -> None:
+        """
+        draw the pie chart of the totals by category into the existing axes
+        """
+        
+        self._monthly_chart_key = key
+        start_month, end_month = key[:2]
+        period = start_month if start_month == end_month else f"{start_month} - {end_month}"
 
         # create pie chart
-        fig = Figure(figsize=(5, 5))
-        ax = fig.add_subplot(111)
+        ax = self.monthly_axes
+        ax.clear()
         if category_totals:
             # append percentage ans total amount to labels
             values = list(category_totals.values())
@@ -359,20 +640,16 @@ class Window(QWidget):
             ]
             # create pie chart with values and labels
             ax.pie(
-                values,
+                [float(value) for value in values],
                 labels = labels,
                 startangle = 90,
                 wedgeprops = dict(width=0.3, edgecolor='w')
             )
-            ax.set_title("Expenses by Category")
+            ax.set_title(f"Expenses by Category, {period}")
         else:
             ax.text(0.5, 0.5, "No data for this month", ha='center', va='center')
-
-        # create canvas for the pie chart
-        canvas = FigureCanvas(fig)
-        monthly_layout.addWidget(canvas, 0, 0, 1, 1)
-
-        return monthly_content
+            ax.set_axis_off()
+        self.monthly_canvas.draw_idle()
 
         
     
@@ -384,36 +661,79 @@ class Window(QWidget):
         """
         pop up a dialog to add a new expense using the ExpenseDialog class
         call the add_expense method from db.py if confirmed
-        call the refresh_table method to update the table
+        and insert the new row into the table
         """
         
-        dialog = ExpenseDialog(self)
+        dialog = ExpenseDialog(self, categories=self.categories)
         if dialog.exec_() == QDialog.Accepted:
-            expense_data = dialog.get_expense_data()
-            db.add_expense(expense_data)
-            self.refresh_table()
+            self._save_new_expense(dialog.get_expense_data())
+    
+    
+    def _save_new_expense(self, expense_data, allow_duplicate=False) -> None:
+        """
+        add an expense in the background, ask before adding a duplicate of a stored expense
+        """
+        
+        def failed(error) -> None:
+            if not isinstance(error, db.DuplicateExpenseError):
+                self._show_db_error(error)
+                return
+            reply = QMessageBox.question(
+                self,
+                "Duplicate Expense",
+                "An expense with the same date, name and amount already exists. Add it anyway?",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No
+            )
+            if reply == QMessageBox.Yes:
+                self._save_new_expense(expense_data, allow_duplicate=True)
+        
+        self.db_executor.write(
+            db.add_expense, expense_data,
+            allow_duplicate = allow_duplicate,
+            on_result = lambda expense: self._update_table(lambda: self.expenses_model.insert_expense(expense)),
+            on_error = failed
+        )
     
     
     def edit_expense(self, expense_id) -> None:
         """
-        pop up a dialog to edit an expense using the ExpenseDialog class
+        load the expense and pop up a dialog to edit it using the ExpenseDialog class
         call the edit_expense method from db.py if confirmed
-        call the refresh_table method to update the table
+        and update the edited row in the table
+        """
+        
+        self.db_executor.read(
+            db.get_expense_by_id, expense_id,
+            key = "edit_expense",
+            on_result = lambda expense: self._edit_expense_dialog(expense_id, expense)
+        )
+    
+    
+    def _edit_expense_dialog(self, expense_id, expense) -> None:
+        """
+        pop up the ExpenseDialog for a loaded expense and save the changes
         """
         
-        expense = db.get_expense_by_id(expense_id)
-        dialog = ExpenseDialog(self, expense)
+        if expense is None:
+            self._update_table(lambda: self.expenses_model.remove_expense(expense_id))
+            return
+        dialog = ExpenseDialog(self, expense, self.categories)
         if dialog.exec_() == QDialog.Accepted:
             expense_data = dialog.get_expense_data()
-            db.edit_expense(expense_id, expense_data)
-            self.refresh_table()
+            self.db_executor.write(
+                db.edit_expense, expense_id, expense_data,
+                on_result = lambda expense: self._update_table(
+                    lambda: self.expenses_model.update_expense(expense) if expense else self.expenses_model.remove_expense(expense_id)
+                )
+            )
         
     
     def delete_expense(self, expense_id) -> None:
         """
         pop up a confirmation dialog to delete an expense
         call the delete_expense method from db.py if confirmed
-        call the refresh_table method to update the table
+        and remove the row from the table
         """
         
         reply = QMessageBox.question(
@@ -424,8 +744,121 @@ class Window(QWidget):
             QMessageBox.No
         )
         if reply == QMessageBox.Yes:
-            db.delete_expense(expense_id)
+            self.db_executor.write(
+                db.delete_expense, expense_id,
+                on_result = lambda _: self._update_table(lambda: self.expenses_model.remove_expense(expense_id))
+            )
+    
+    
+    def export_expenses(self) -> None:
+        """
+        ask for a file and export the expenses passing the current filters to it
+        the export runs in the background, a progress dialog can cancel it
+        """
+        
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Expenses", "expenses.csv",
+            "CSV (*.csv);;JSON Lines (*.jsonl);;Parquet (*.parquet)"
+        )
+        if not path:
+            return
+        
+        progress_dialog = QProgressDialog("Exporting expenses...", "Cancel", 0, 100, self)
+        progress_dialog.setMinimumDuration(0)
+        progress_dialog.setValue(0)
+        cancelled = threading.Event()
+        progress_dialog.canceled.connect(cancelled.set)
+        
+        # progress is reported on the reader thread, the signal hands it to the GUI thread
+        progress = ExportProgress(progress_dialog)
+        progress.changed.connect(lambda done, total: progress_dialog.setValue(done * 100 // total if total else 100))
+        
+        def finished(count) -> None:
+            progress_dialog.deleteLater()
+            QMessageBox.information(self, "Export", f"Exported {count} expenses to {path}")
+        
+        def failed(error) -> None:
+            progress_dialog.deleteLater()
+            if not isinstance(error, export.ExportCancelled):
+                self._show_db_error(error)
+        
+        self.db_executor.read(
+            export.export_expenses, path,
+            progress = progress.changed.emit,
+            cancelled = cancelled.is_set,
+            on_result = finished,
+            on_error = failed,
+            **self.expenses_model.filters
+        )
+    
+    
+    def import_expenses(self) -> None:
+        """
+        ask for a bank statement, pop up the ImportDialog to map its columns
+        and preview it, then import it in the background
+        """
+        
+        # the importer loads multiprocessing, it is only imported once it is used
+        import importer
+        
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Import Bank Statement", "",
+            "Bank statements (*.csv *.ofx *.qfx *.xml);;CSV (*.csv);;OFX (*.ofx *.qfx);;CAMT.053 (*.xml)"
+        )
+        if not path:
+            return
+        
+        dialog = ImportDialog(self.db_executor, path, self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        
+        def finished(result) -> None:
+            self._set_loading(False)
+            message = f"Imported {result.inserted} expenses, skipped {result.skipped} credits and {result.duplicates} duplicates."
+            if result.errors:
+                message += f"\n\n{len(result.errors)} rows were not imported:\n" + ImportDialog.format_errors(result.errors)
+            QMessageBox.information(self, "Import", message)
             self.refresh_table()
+            self._load_filter_categories()
+            if self.stacked_content.currentIndex() == 1:
+                self.refresh_monthly_content()
+        
+        def failed(error) -> None:
+            self._set_loading(False)
+            self._show_db_error(error)
+        
+        # parse on a reader thread, only the insert of the parsed rows has
+        # to wait for the writer thread
+        def parsed(result) -> None:
+            self.db_executor.write(importer.write_result, result, on_result=finished, on_error=failed)
+        
+        self._set_loading(True)
+        self.db_executor.read(
+            importer.parse_file, path, dialog.format, dialog.get_mapping(), dry_run=False,
+            on_result = parsed,
+            on_error = failed
+        )
+    
+    
+    def _update_table(self, change) -> None:
+        """
+        apply a row change to the table model, keeping the row at the top
+        of the view in place so the table does not jump
+        """
+        
+        top_row = self.expenses_table.rowAt(0)
+        top_id = self.expenses_model.expense_at(top_row).id if top_row >= 0 else None
+        change()
+        row = self.expenses_model.row_of(top_id)
+        if row is not None:
+            self.expenses_table.scrollTo(self.expenses_model.index(row, 0), QAbstractItemView.PositionAtTop)
+        
+        # a new category shows up in the category filter
+        self._load_filter_categories()
+        
+        # the monthly chart redraws itself when it is shown next
+        if self.stacked_content.currentIndex() == 1:
+            self.refresh_monthly_content()
     
     
     def refresh_table(self) -> None:
@@ -434,6 +867,31 @@ class Window(QWidget):
         """
         
         self._populate_expenses_table()  
+    
+    
+    def _set_loading(self, loading) -> None:
+        """
+        show or hide the loading indicator
+        """
+        
+        self.status_label.setStyleSheet("color: #555555;" if loading else "color: transparent;")
+    
+    
+    def _show_db_error(self, error) -> None:
+        """
+        show an error raised by a background database call
+        """
+        
+        QMessageBox.warning(self, "Database Error", str(error))
+    
+    
+    def closeEvent(self, event) -> None:
+        """
+        wait for pending writes before the window closes
+        """
+        
+        self.db_executor.wait_for_done()
+        super().closeEvent(event)
 
 
 
@@ -445,9 +903,10 @@ class ExpenseDialog(QDialog):
     """
     dialog for adding or editing an expense
     """
-    def __init__(self, parent=None, expense=None):
+    def __init__(self, parent=None, expense=None, categories=()):
         """
         initialize the dialog with input fields for expense data
+        categories: the categories loaded by the window, most used first
         """
         
         # call the parent constructor and set up window
@@ -464,13 +923,21 @@ class ExpenseDialog(QDialog):
         layout.addWidget(self.date_input)
         layout.addSpacing(10)
         
-        # category input field
+        # category input field, most used categories first
+        # the categories come from the window, so the dialog never queries the database
         layout.addWidget(QLabel("Category:"))
         self.category_input = QComboBox()
-        categories = db.get_categories()
-        self.category_input.addItems(categories)
+        self.categories = list(categories)
+        self.category_input.addItems(self.categories)
         self.category_input.setEditable(True)
         layout.addWidget(self.category_input)
+        
+        # completer with prefix and fuzzy matches, filled by db.match_categories()
+        self.category_completer = QCompleter(self)
+        self.category_completer.setModel(QStringListModel(self.categories, self.category_completer))
+        self.category_completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.category_input.setCompleter(self.category_completer)
+        self.category_input.lineEdit().textEdited.connect(self._complete_category)
         layout.addSpacing(10)
         
         # name input field
@@ -527,6 +994,29 @@ class ExpenseDialog(QDialog):
             self.fixed_checkbox.setChecked(False)
             self.comment_input.setText("")
     
+    
+    def _complete_category(self, text) -> None:
+        """
+        show the categories matching the typed text
+        """
+        
+        self.category_completer.model().setStringList(db.match_categories(text, limit=20, categories=self.categories))
+        if text:
+            self.category_completer.complete()
+    
+    
+    def accept(self) -> None:
+        """
+        validate the amount before closing the dialog
+        """
+        
+        try:
+            db.parse_amount(self.amount_input.text())
+        except ValueError:
+            QMessageBox.warning(self, "Invalid Amount", "Please enter a valid amount, e.g. 12.34")
+            return
+        super().accept()
+    
        
     def get_expense_data(self) -> dict:
         """
@@ -537,13 +1027,640 @@ class ExpenseDialog(QDialog):
             "date": self.date_input.text(),
             "category": self.category_input.currentText(),
             "name": self.name_input.text(),
-            "amount": float(self.amount_input.text()),
+            "amount": db.parse_amount(self.amount_input.text()),
             "fixed": 1 if self.fixed_checkbox.isChecked() else 0,
             "comment": self.comment_input.toPlainText()
         }
 
 
 
+# ========================
+# import dialog class
+# ========================
+
+class ImportDialog(QDialog):
+    """
+    dialog for mapping the columns of a bank statement and previewing the import
+    """
+    
+    # number of expenses and errors shown in the preview
+    PREVIEW_ROWS = 20
+    
+    def __init__(self, executor, path, parent=None):
+        """
+        initialize the dialog, CSV files get input fields for the column mapping
+        """
+        
+        import importer
+        
+        super().__init__(parent)
+        self.executor = executor
+        self.path = path
+        self.format = importer.detect_format(path)
+        self.setWindowTitle("Import Bank Statement")
+        self.setMinimumWidth(500)
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(f"File: {path}"))
+        
+        # column mapping, only for CSV files
+        self.mapping_inputs = {}
+        if self.format == "csv":
+            defaults = importer.CsvMapping()
+            mapping_layout = QGridLayout()
+            fields = [
+                ("date", "Date column:"),
+                ("amount", "Amount column:"),
+                ("name", "Name column:"),
+                ("category", "Category column:"),
+                ("comment", "Comment column:"),
+            ]
+            for row, (field, label) in enumerate(fields):
+                mapping_layout.addWidget(QLabel(label), row, 0)
+                self.mapping_inputs[field] = QLineEdit(defaults.columns[field] or "")
+                mapping_layout.addWidget(self.mapping_inputs[field], row, 1)
+            options = [
+                ("date_format", "Date format:", defaults.date_format),
+                ("decimal", "Decimal mark:", defaults.decimal),
+                ("delimiter", "Delimiter:", defaults.delimiter),
+                ("default_category", "Default category:", defaults.default_category),
+            ]
+            for row, (option, label, value) in enumerate(options, start=len(fields)):
+                mapping_layout.addWidget(QLabel(label), row, 0)
+                self.mapping_inputs[option] = QLineEdit(value)
+                mapping_layout.addWidget(self.mapping_inputs[option], row, 1)
+            layout.addLayout(mapping_layout)
+            
+            self.header_checkbox = QCheckBox("First row is a header (otherwise columns are numbers, starting at 1)")
+            self.header_checkbox.setChecked(defaults.has_header)
+            layout.addWidget(self.header_checkbox)
+            self.debit_checkbox = QCheckBox("Expenses are negative amounts (positive rows are skipped)")
+            self.debit_checkbox.setChecked(defaults.debit_negative)
+            layout.addWidget(self.debit_checkbox)
+        
+        # dry-run preview
+        self.preview_label = QLabel("Preview the import to check the mapping.")
+        layout.addWidget(self.preview_label)
+        self.preview_text = QTextEdit()
+        self.preview_text.setReadOnly(True)
+        self.preview_text.setFixedHeight(200)
+        layout.addWidget(self.preview_text)
+        
+        # buttons
+        btn_layout = QHBoxLayout()
+        self.preview_btn = QPushButton("Preview")
+        self.import_btn = QPushButton("Import")
+        self.cancel_btn = QPushButton("Cancel")
+        btn_layout.addWidget(self.preview_btn)
+        btn_layout.addWidget(self.import_btn)
+        btn_layout.addWidget(self.cancel_btn)
+        layout.addLayout(btn_layout)
+        self.preview_btn.clicked.connect(lambda _: self.preview())
+        self.import_btn.clicked.connect(self.accept)
+        self.cancel_btn.clicked.connect(self.reject)
+    
+    
+    def get_mapping(self):
+        """
+        get the column mapping from the input fields, None for other formats
+        """
+        
+        import importer
+        
+        if self.format != "csv":
+            return None
+        has_header = self.header_checkbox.isChecked()
+        columns = {}
+        for field in ("date", "amount", "name", "category", "comment"):
+            text = self.mapping_inputs[field].text().strip()
+            if not text:
+                columns[field] = None
+            elif has_header:
+                columns[field] = text
+            else:
+                columns[field] = int(text) - 1 if text.isdigit() and int(text) > 0 else text
+        return importer.CsvMapping(
+            **columns,
+            date_format = self.mapping_inputs["date_format"].text(),
+            decimal = self.mapping_inputs["decimal"].text() or ".",
+            delimiter = self.mapping_inputs["delimiter"].text() or ",",
+            has_header = has_header,
+            debit_negative = self.debit_checkbox.isChecked(),
+            default_category = self.mapping_inputs["default_category"].text().strip() or importer.DEFAULT_CATEGORY
+        )
+    
+    
+    def preview(self) -> None:
+        """
+        parse the file in the background without writing anything and show the outcome
+        """
+        
+        import importer
+        
+        self.preview_label.setText("Reading file...")
+        self.preview_btn.setEnabled(False)
+        self.executor.read(
+            importer.parse_file, self.path, self.format, self.get_mapping(),
+            key = "import_preview",
+            on_result = self._show_preview,
+            on_error = self._preview_failed
+        )
+    
+    
+    def _show_preview(self, result) -> None:
+        """
+        show the first expenses and errors of a dry run
+        """
+        
+        self.preview_btn.setEnabled(True)
+        self.preview_label.setText(
+            f"{len(result.expenses) - result.duplicates} expenses would be imported, "
+            f"{result.skipped} credits and {result.duplicates} duplicates skipped, {len(result.errors)} errors."
+        )
+        lines = [
+            f"{expense['date']}  {expense['amount']:>10} €  {expense['category']}  {expense['name']}"
+            for _, expense in result.expenses[:self.PREVIEW_ROWS]
+        ]
+        if result.errors:
+            lines += ["", "Errors:", self.format_errors(result.errors)]
+        self.preview_text.setPlainText("\n".join(lines))
+    
+    
+    def _preview_failed(self, error) -> None:
+        """
+        show why the file could not be read
+        """
+        
+        self.preview_btn.setEnabled(True)
+        self.preview_label.setText(f"The file could not be read: {error}")
+        self.preview_text.clear()
+    
+    
+    @classmethod
+    def format_errors(cls, errors) -> str:
+        """
+        return the first (position, message) errors as lines
+        """
+        
+        lines = [f"{position}: {message}" for position, message in errors[:cls.PREVIEW_ROWS]]
+        if len(errors) > cls.PREVIEW_ROWS:
+            lines.append(f"... and {len(errors) - cls.PREVIEW_ROWS} more")
+        return "\n".join(lines)
+
+
+
+# ========================
+# export progress
+# ========================
+
+class ExportProgress(QObject):
+    """
+    carries the progress of a background export to the GUI thread
+    """
+    
+    # rows written, total rows
+    changed = pyqtSignal(int, int)
+
+
+
+# ========================
+# expenses table model
+# ========================
+
+class ExpensesTableModel(QAbstractTableModel):
+    """
+    table model over the expenses table
+    
+    rows are fetched lazily from the database in pages (newest first) as the
+    view scrolls, on a DbExecutor reader thread, and cell values are formatted
+    on demand in data()
+    
+    if search is set, the rows are the db.search_expenses() results instead,
+    paged by offset and ranked by relevance while order_by is None
+    
+    sorting and filtering run in the database: sort() and a change of the
+    filters reload the rows from the first page
+    """
+    
+    # emitted on the GUI thread after a page has been added
+    page_loaded = pyqtSignal()
+    
+    # executor key of the page reads, a reset drops the page still loading
+    PAGE_KEY = "expenses_page"
+    
+    # data columns followed by the edit and delete button columns
+    FIELDS = db.Expense.fields[1:]
+    EDIT_COL_INDEX = len(FIELDS)
+    DELETE_COL_INDEX = len(FIELDS) + 1
+    
+    # comments longer than this are truncated and shown in a tooltip
+    MAX_COMMENT_LENGTH = 50
+    
+    def __init__(self, executor, parent=None, page_size=db.PAGE_SIZE) -> None:
+        """
+        initialize an empty model, call fetchMore() to load the first page
+        """
+        
+        super().__init__(parent)
+        self.executor = executor
+        self.page_size = page_size
+        self.headers = [field.capitalize() for field in self.FIELDS] + ["Edit", "Delete"]
+        self.order_by = "date"
+        self.descending = True
+        self.filters = {}
+        self.search = ""
+        self._expenses = []
+        self._ids = set()
+        self._cursor = None
+        self._has_more = True
+        self._loading = False
+        self._generation = 0
+    
+    
+    def reset(self) -> None:
+        """
+        drop all loaded rows, the next fetchMore() starts at the first page
+        """
+        
+        self.beginResetModel()
+        self.executor.cancel(self.PAGE_KEY)
+        self._generation += 1
+        self._expenses = []
+        self._ids = set()
+        self._cursor = None
+        self._has_more = True
+        self._loading = False
+        self.endResetModel()
+    
+    
+    def expense_at(self, row) -> db.Expense:
+        """
+        return the expense shown in the given row
+        """
+        
+        return self._expenses[row]
+    
+    
+    def row_of(self, expense_id) -> int | None:
+        """
+        return the row showing the expense with the given ID, None if not loaded
+        """
+        
+        if expense_id not in self._ids:
+            return None
+        for row, expense in enumerate(self._expenses):
+            if expense.id == expense_id:
+                return row
+        return None
+    
+    
+    def _sort_key(self, expense) -> tuple:
+        """
+        return the key the rows are sorted by, matching db.query_expenses()
+        """
+        
+        value = getattr(expense, self.order_by)
+        return (value if value is not None else "", expense.id)
+    
+    
+    def _matches(self, expense) -> bool:
+        """
+        return whether the expense passes the model's filters
+        """
+        
+        filters = self.filters
+        category = filters.get("category")
+        if filters.get("start_date") is not None and expense.date < str(filters["start_date"]):
+            return False
+        if filters.get("end_date") is not None and expense.date > str(filters["end_date"]):
+            return False
+        if category is not None and expense.category not in ([category] if isinstance(category, str) else category):
+            return False
+        if filters.get("fixed") is not None and bool(expense.fixed) != bool(filters["fixed"]):
+            return False
+        if filters.get("min_amount") is not None and expense.cents < db.to_cents(filters["min_amount"]):
+            return False
+        if filters.get("max_amount") is not None and expense.cents > db.to_cents(filters["max_amount"]):
+            return False
+        return True
+    
+    
+    def _insert_position(self, expense) -> int | None:
+        """
+        return the row the expense belongs to in the sorted rows,
+        None if it sorts after the loaded rows and will come with a later page
+        """
+        
+        key = self._sort_key(expense)
+        low, high = 0, len(self._expenses)
+        while low < high:
+            middle = (low + high) // 2
+            middle_key = self._sort_key(self._expenses[middle])
+            if (middle_key > key) if self.descending else (middle_key < key):
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(self._expenses) and self._has_more:
+            return None
+        return low
+    
+    
+    def insert_expense(self, expense) -> None:
+        """
+        insert a new expense at its sorted position, if it is in the loaded range
+        """
+        
+        # search results are ranked by relevance, new expenses show up on the next search
+        if self.search or expense.id in self._ids or not self._matches(expense):
+            return
+        row = self._insert_position(expense)
+        if row is not None:
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._expenses.insert(row, expense)
+            self._ids.add(expense.id)
+            self.endInsertRows()
+    
+    
+    def update_expense(self, expense) -> None:
+        """
+        update the row of an edited expense, moving it if its sort position changed
+        """
+        
+        row = self.row_of(expense.id)
+        if row is None:
+            self.insert_expense(expense)
+            return
+        
+        # search results keep their rank until the next search
+        if self.search:
+            self._expenses[row] = expense
+            self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+            return
+        
+        old_key = self._sort_key(self._expenses[row])
+        if self._matches(expense) and self._sort_key(expense) == old_key:
+            self._expenses[row] = expense
+            self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+        else:
+            self.remove_expense(expense.id)
+            self.insert_expense(expense)
+    
+    
+    def remove_expense(self, expense_id) -> None:
+        """
+        remove the row of a deleted expense
+        """
+        
+        row = self.row_of(expense_id)
+        if row is not None:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._expenses[row]
+            self._ids.discard(expense_id)
+            self.endRemoveRows()
+    
+    
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._expenses)
+    
+    
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.headers)
+    
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
+    
+    
+    def sort(self, column, order=Qt.AscendingOrder) -> None:
+        """
+        sort by a data column, the rows are reloaded from the database
+        """
+        
+        if not 0 <= column < len(self.FIELDS):
+            return
+        order_by = self.FIELDS[column]
+        descending = order == Qt.DescendingOrder
+        if (order_by, descending) == (self.order_by, self.descending):
+            return
+        self.order_by = order_by
+        self.descending = descending
+        self.reset()
+        self.fetchMore()
+    
+    
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        return not parent.isValid() and self._has_more and not self._loading
+    
+    
+    def fetchMore(self, parent=QModelIndex()) -> None:
+        """
+        load the next page of expenses from the database in the background
+        """
+        
+        if not self.canFetchMore(parent):
+            return
+        self._loading = True
+        generation = self._generation
+        if self.search:
+            self._fetch_search_page(generation)
+            return
+        self.executor.read(
+            db.query_expenses,
+            order_by = self.order_by,
+            descending = self.descending,
+            limit = self.page_size,
+            after = self._cursor,
+            key = self.PAGE_KEY,
+            on_result = lambda page: self._add_page(page, generation),
+            on_error = lambda error: self._page_failed(error, generation),
+            **self.filters
+        )
+    
+    
+    def _fetch_search_page(self, generation) -> None:
+        """
+        load the next page of search results, the cursor is the offset of the page
+        """
+        
+        offset = self._cursor or 0
+        
+        def add_results(expenses) -> None:
+            cursor = offset + len(expenses) if len(expenses) == self.page_size else None
+            self._add_page((expenses, cursor), generation)
+        
+        self.executor.read(
+            db.search_expenses,
+            self.search,
+            order_by = self.order_by,
+            descending = self.descending,
+            limit = self.page_size,
+            offset = offset,
+            key = self.PAGE_KEY,
+            on_result = add_results,
+            on_error = lambda error: self._page_failed(error, generation),
+            **self.filters
+        )
+    
+    
+    def _add_page(self, page, generation) -> None:
+        """
+        append a loaded page, unless the model was reset in the meantime
+        """
+        
+        if generation != self._generation:
+            return
+        expenses, self._cursor = page
+        self._loading = False
+        self._has_more = self._cursor is not None
+        
+        # rows inserted by insert_expense() while the page was loading are skipped
+        expenses = [expense for expense in expenses if expense.id not in self._ids]
+        if expenses:
+            first = len(self._expenses)
+            self.beginInsertRows(QModelIndex(), first, first + len(expenses) - 1)
+            self._expenses.extend(expenses)
+            self._ids.update(expense.id for expense in expenses)
+            self.endInsertRows()
+        self.page_loaded.emit()
+    
+    
+    def _page_failed(self, error, generation) -> None:
+        """
+        stop loading after a failed page read and report the error
+        """
+        
+        if generation == self._generation:
+            self._loading = False
+            self._has_more = False
+        self.executor.error.emit(error)
+    
+    
+    def data(self, index, role=Qt.DisplayRole):
+        """
+        format the value of a cell when the view asks for it
+        """
+        
+        if not index.isValid() or index.column() >= len(self.FIELDS):
+            return None
+        field = self.FIELDS[index.column()]
+        value = getattr(self._expenses[index.row()], field)
+        
+        if role == Qt.DisplayRole:
+            if field == "amount":
+                return f"{value:.2f}€"
+            elif field == "fixed":
+                return "Fixed" if value == 1 else "Variable"
+            elif field == "comment":
+                # truncate long comments, the full text is in the tooltip
+                value = value or ""
+                return value[:40] + "..." if len(value) > self.MAX_COMMENT_LENGTH else value
+            return str(value)
+        
+        elif role == Qt.TextAlignmentRole:
+            if field in ("date", "fixed"):
+                return Qt.AlignCenter
+            elif field == "amount":
+                return Qt.AlignRight | Qt.AlignVCenter
+            return Qt.AlignLeft | Qt.AlignVCenter
+        
+        elif role == Qt.ToolTipRole:
+            if field == "comment" and value and len(value) > self.MAX_COMMENT_LENGTH:
+                return value
+        
+        return None
+
+
+
+# ========================
+# button delegate
+# ========================
+
+class ButtonDelegate(QStyledItemDelegate):
+    """
+    paints a button into every cell of a table column
+    and emits clicked(row) when it is clicked
+    """
+    
+    clicked = pyqtSignal(int)
+    
+    # size of the painted button in pixels
+    BUTTON_WIDTH = 61
+    BUTTON_HEIGHT = 22
+    
+    def __init__(self, text, color, hover_color, parent=None) -> None:
+        """
+        initialize the delegate with the button text and background colors
+        """
+        
+        super().__init__(parent)
+        self.text = text
+        self.color = QColor(color)
+        self.hover_color = QColor(hover_color)
+        self.pressed_color = QColor("#888888")
+        self._pressed_row = None
+    
+    
+    def _button_rect(self, option) -> QRect:
+        """
+        return the button rectangle, centered in the cell
+        """
+        
+        rect = QRect(0, 0, self.BUTTON_WIDTH, self.BUTTON_HEIGHT)
+        rect.moveCenter(option.rect.center())
+        return rect
+    
+    
+    def paint(self, painter, option, index) -> None:
+        """
+        paint the cell background and the button
+        """
+        
+        super().paint(painter, option, index)
+        rect = self._button_rect(option)
+        hovered = bool(option.state & QStyle.State_MouseOver)
+        
+        if self._pressed_row == index.row() and hovered:
+            background = self.pressed_color
+        elif hovered:
+            background = self.hover_color
+        else:
+            background = self.color
+        
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(QPen(QColor("#aaaaaa" if hovered else "#555555"), 2))
+        painter.setBrush(background)
+        painter.drawRoundedRect(rect, 8, 8)
+        font = QFont(option.font)
+        font.setPixelSize(13)
+        painter.setFont(font)
+        painter.setPen(Qt.black)
+        painter.drawText(rect, Qt.AlignCenter, self.text)
+        painter.restore()
+    
+    
+    def editorEvent(self, event, model, option, index) -> bool:
+        """
+        emit clicked(row) when the mouse is pressed and released on the button
+        """
+        
+        if event.type() not in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease) or event.button() != Qt.LeftButton:
+            return False
+        
+        on_button = self._button_rect(option).contains(event.pos())
+        if event.type() == QEvent.MouseButtonPress:
+            self._pressed_row = index.row() if on_button else None
+            return on_button
+        
+        clicked = on_button and self._pressed_row == index.row()
+        self._pressed_row = None
+        if clicked:
+            self.clicked.emit(index.row())
+        return clicked
+
+
+
 # ========================
 # design functions
 # ========================
@@ -602,61 +1719,3 @@ def style_side_bar_btns(button) -> None:
             background-color: #888888;
         }
     """)
-
-
-def style_edit_btns(button) -> None:
-    """
-    style the edit buttons in the expenses table
-    """
-    
-    button.setStyleSheet("""
-        QPushButton {
-            background-color: #00CD00;
-            color: black;
-            border-radius: 8px;
-            padding: 3px 6px;
-            font-size: 13px;
-            min-width: 45px;
-            max-width: 45px;
-            min-height: 12px;
-            max-height: 12px;
-            border: 2px solid #555555;
-        }
-        QPushButton:hover {
-            background-color: #00FF00;
-            border: 2px solid #aaaaaa;
-        }
-        QPushButton:pressed {
-            background-color: #888888;
-        }
-    """)
-
-
-def style_delete_btns(button) -> None:
-    """
-    style the delete buttons in the expenses table 
-    """
-    
-    button.setStyleSheet("""
-        QPushButton {
-            background-color: #CD0000;
-            color: black;
-            border-radius: 8px;
-            padding: 3px 6px;
-            font-size: 13px;
-            min-width: 45px;
-            max-width: 45px;
-            min-height: 12px;
-            max-height: 12px;
-            border: 2px solid #555555;
-        }
-        QPushButton:hover {
-            background-color: #FF0000;
-            border: 2px solid #aaaaaa;
-        }
-        QPushButton:pressed {
-            background-color: #888888;
-        }
-    """)
-    
-    
\ No newline at end of file
@@ -0,0 +1,238 @@
+# worker.py
+
+"""
+Runs db.py calls off the GUI thread, so a slow query or a locked database
+never freezes the window.
+
+Reads run on a small thread pool. Reads submitted with a key are coalesced:
+at most one read per key is in flight, a newer read replaces the one still
+waiting, and results of superseded reads are dropped. Writes run on a single
+thread in the order they were submitted. Results and errors are delivered
+to the callbacks on the GUI thread through Qt signals.
+
+Every pool thread gets its own SQLite connection from db.get_connection().
+"""
+
+
+
+# =========================
+# imports
+# =========================
+from PyQt5.QtCore import QCoreApplication, QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+
+# =========================
+# classes
+# =========================
+class _TaskSignals(QObject):
+    """
+    signals of a DbTask, QRunnable itself cannot emit signals
+    """
+
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+
+class DbTask(QRunnable):
+    """
+    a single db.py call, run by a DbExecutor thread pool
+    """
+
+    def __init__(self, function, args, kwargs, key=None) -> None:
+        super().__init__()
+        self.setAutoDelete(False)   # the executor keeps track of the task
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.cancelled = False
+        self.signals = _TaskSignals()
+
+
+    def run(self) -> None:
+        """
+        call the function on the pool thread and emit the result or the error
+        """
+
+        if self.cancelled:
+            self._emit("failed", None)
+            return
+        try:
+            result = self.function(*self.args, **self.kwargs)
+        except Exception as e:
+            self._emit("failed", e)
+        else:
+            self._emit("finished", result)
+
+
+    def _emit(self, name, value) -> None:
+        """
+        emit a signal of the task, unless Qt deleted the signals object
+        while the task ran, e.g. when the application quit
+        """
+
+        try:
+            getattr(self.signals, name).emit(value)
+        except RuntimeError:
+            pass
+
+
+    def cancel(self) -> None:
+        """
+        drop the result of the task, it is not run if it has not started yet
+        """
+
+        self.cancelled = True
+
+
+class DbExecutor(QObject):
+    """
+    submits db.py calls to background threads and delivers the results
+    to callbacks on the GUI thread
+    """
+
+    # emitted with True when the first task starts and False when the last one ends
+    busy_changed = pyqtSignal(bool)
+
+    # emitted with the exception of a failed task that has no on_error callback
+    error = pyqtSignal(object)
+
+    def __init__(self, parent=None, max_readers=2) -> None:
+        """
+        initialize the read and write thread pools
+        """
+
+        super().__init__(parent)
+
+        # pool threads are kept alive, so their connections are reused
+        self.read_pool = QThreadPool(self)
+        self.read_pool.setMaxThreadCount(max_readers)
+        self.read_pool.setExpiryTimeout(-1)
+
+        # a single writer thread applies writes in submission order
+        self.write_pool = QThreadPool(self)
+        self.write_pool.setMaxThreadCount(1)
+        self.write_pool.setExpiryTimeout(-1)
+
+        self._tasks = set()     # submitted tasks that have not finished yet
+        self._running = {}      # key -> read in flight
+        self._waiting = {}      # key -> (read, on_result, on_error) waiting for the read in flight
+
+        # let the tasks finish before Qt deletes their signals on exit
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.wait_for_done)
+
+
+    def read(self, function, *args, key=None, on_result=None, on_error=None, **kwargs) -> DbTask:
+        """
+        run function(*args, **kwargs) on a reader thread
+        key: reads with the same key replace each other, only the newest result is delivered
+        """
+
+        task = DbTask(function, args, kwargs, key)
+        if key is not None:
+            # supersede the read in flight and the one waiting for it
+            if key in self._running:
+                self._running[key].cancel()
+                waiting = self._waiting.pop(key, None)
+                if waiting:
+                    waiting[0].cancel()
+                    self._finish(waiting[0])
+                self._waiting[key] = (task, on_result, on_error)
+                self._tasks.add(task)
+                return task
+            self._running[key] = task
+
+        self._submit(self.read_pool, task, on_result, on_error)
+        return task
+
+
+    def write(self, function, *args, on_result=None, on_error=None, **kwargs) -> DbTask:
+        """
+        run function(*args, **kwargs) on the writer thread, after all earlier writes
+        """
+
+        task = DbTask(function, args, kwargs)
+        self._submit(self.write_pool, task, on_result, on_error)
+        return task
+
+
+    def cancel(self, key) -> None:
+        """
+        drop the results of the reads with the given key
+        """
+
+        if key in self._running:
+            self._running[key].cancel()
+        waiting = self._waiting.pop(key, None)
+        if waiting:
+            waiting[0].cancel()
+            self._finish(waiting[0])
+
+
+    def is_busy(self) -> bool:
+        """
+        return whether any task is queued or running
+        """
+
+        return bool(self._tasks)
+
+
+    def wait_for_done(self, msecs=-1) -> None:
+        """
+        block until all queued reads and writes have run
+        the results are delivered once the event loop runs again
+        """
+
+        self.write_pool.waitForDone(msecs)
+        self.read_pool.waitForDone(msecs)
+
+
+    def _submit(self, pool, task, on_result, on_error) -> None:
+        """
+        connect the callbacks of a task and start it on the pool
+        """
+
+        task.signals.finished.connect(lambda result: self._deliver(task, on_result, result))
+        task.signals.failed.connect(lambda error: self._deliver(task, on_error, error))
+        if task not in self._tasks:
+            self._tasks.add(task)
+            if len(self._tasks) == 1:
+                self.busy_changed.emit(True)
+        pool.start(task)
+
+
+    def _deliver(self, task, callback, value) -> None:
+        """
+        runs on the GUI thread: start the read waiting for this key, then
+        pass the result or error on, unless the task was cancelled
+        the task is finished before the callback runs, so a callback that
+        opens a modal dialog does not keep the executor busy
+        """
+
+        if task.key is not None and self._running.get(task.key) is task:
+            del self._running[task.key]
+            waiting = self._waiting.pop(task.key, None)
+            if waiting:
+                next_task, on_result, on_error = waiting
+                self._running[task.key] = next_task
+                self._submit(self.read_pool, next_task, on_result, on_error)
+        self._finish(task)
+
+        if not task.cancelled:
+            if callback is not None:
+                callback(value)
+            elif isinstance(value, Exception):
+                self.error.emit(value)
+
+
+    def _finish(self, task) -> None:
+        """
+        forget a finished or dropped task
+        """
+
+        self._tasks.discard(task)
+        if not self._tasks:
+            self.busy_changed.emit(False)